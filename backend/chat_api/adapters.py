@@ -0,0 +1,173 @@
+# chat_api/adapters.py
+# 베이스 Gemma 하나에 이름 붙인 LoRA 어댑터 여러 개를 올려두고 요청마다 골라 쓴다
+# PEFT 의 활성 어댑터는 모델 전체에 하나이므로, 같은 어댑터를 쓰는 생성끼리만 동시에 돌고
+# 다른 어댑터 요청은 지금 돌고 있는 생성이 끝난 뒤 어댑터를 바꿔서 실행한다
+import os
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from peft import PeftModel
+
+from . import llama_loader
+from .answer_cache import get_answer_cache
+from .llama_loader import get_model_and_tokenizer
+from .prefix_cache import get_prefix_cache
+
+
+class UnknownAdapter(ValueError):
+    pass
+
+
+class AdapterRegistry:
+    def __init__(self):
+        self.current = None        # 모델에 활성화된 어댑터
+        self.active = 0            # current 로 생성 중인 요청 수
+        self.waiting = Counter()   # 어댑터별 대기 수
+        self.exclusive = 0         # 어댑터 로딩/삭제 요청 수 (대기 중 포함). 있으면 새 생성은 시작하지 않는다
+        self.managing = False      # 어댑터 로딩/삭제 실행 중
+        self.cond = threading.Condition()
+
+    def default_name(self):
+        get_model_and_tokenizer()
+        return next(iter(llama_loader.adapter_paths))
+
+    def resolve(self, name):
+        # None 이면 기본 어댑터. 없는 이름이면 UnknownAdapter
+        get_model_and_tokenizer()
+        if name is None:
+            return self.default_name()
+        if name not in llama_loader.adapter_paths:
+            raise UnknownAdapter(f"알 수 없는 어댑터 : {name}")
+        return name
+
+    def _others_waiting(self, name):
+        return any(count for other, count in self.waiting.items() if other != name)
+
+    def acquire(self, name=None):
+        # 어댑터 name 으로 생성할 수 있을 때까지 기다렸다가 활성화. 끝나면 release()
+        name = self.resolve(name)
+        _, model = get_model_and_tokenizer()
+        with self.cond:
+            self.waiting[name] += 1
+            try:
+                # 다른 어댑터가 기다리고 있으면 같은 어댑터라도 새로 끼어들지 않는다 (한쪽이 굶지 않도록)
+                while self.exclusive or not (self.active == 0 or
+                                             (self.current == name and not self._others_waiting(name))):
+                    self.cond.wait()
+            finally:
+                self.waiting[name] -= 1
+            if name not in llama_loader.adapter_paths:
+                # 기다리는 동안 내려간 경우
+                self.cond.notify_all()
+                raise UnknownAdapter(f"알 수 없는 어댑터 : {name}")
+            if self.current != name and isinstance(model, PeftModel):
+                model.set_adapter(name)
+            self.current = name
+            self.active += 1
+        return name
+
+    def release(self):
+        with self.cond:
+            self.active -= 1
+            self.cond.notify_all()
+
+    def contended(self, name):
+        # name 이 아닌 어댑터 또는 어댑터 관리 작업이 기다리는지 (continuous batching 엔진이 합류를 멈추는 기준)
+        with self.cond:
+            return bool(self.exclusive) or self._others_waiting(name)
+
+    @contextmanager
+    def use(self, name=None):
+        name = self.acquire(name)
+        try:
+            yield name
+        finally:
+            self.release()
+
+    @contextmanager
+    def _exclusive(self):
+        # 진행 중인 생성이 모두 끝날 때까지 기다리는 동안 새 생성은 시작하지 않는다
+        with self.cond:
+            self.exclusive += 1
+            while self.active or self.managing:
+                self.cond.wait()
+            self.managing = True
+        try:
+            yield
+        finally:
+            with self.cond:
+                self.exclusive -= 1
+                self.managing = False
+                self.cond.notify_all()
+
+    # ===== 관리 =====
+    def list(self):
+        get_model_and_tokenizer()
+        default = self.default_name()
+        return [{'name': name, 'path': path, 'default': name == default, 'active': name == self.current}
+                for name, path in llama_loader.adapter_paths.items()]
+
+    def load(self, name, path):
+        # 같은 이름이 있으면 새 경로로 교체
+        _, model = get_model_and_tokenizer()
+        if not isinstance(model, PeftModel):
+            raise ValueError("병합 / 양자화 모델에는 어댑터를 추가할 수 없습니다 (CHAT_MODEL_LOAD_MODE='peft' 필요)")
+        if not os.path.isfile(os.path.join(path, "adapter_config.json")):
+            raise ValueError(f"어댑터 디렉토리가 아닙니다 : {path}")
+        with self._exclusive():
+            if name in llama_loader.adapter_paths:
+                self._delete(model, name)
+            model.load_adapter(path, adapter_name=name)
+            llama_loader.adapter_paths = {**llama_loader.adapter_paths, name: path}
+            self._reset_active(model)
+            self._clear_caches()
+        print(f"[INFO] 어댑터 로딩 : {name} ← {path}")
+
+    def unload(self, name):
+        _, model = get_model_and_tokenizer()
+        if name not in llama_loader.adapter_paths:
+            raise UnknownAdapter(f"알 수 없는 어댑터 : {name}")
+        if name == self.default_name():
+            raise ValueError("기본 어댑터는 내릴 수 없습니다")
+        with self._exclusive():
+            self._delete(model, name)
+            llama_loader.adapter_paths = {k: v for k, v in llama_loader.adapter_paths.items() if k != name}
+            self._reset_active(model)
+            self._clear_caches()
+        print(f"[INFO] 어댑터 삭제 : {name}")
+
+    def _delete(self, model, name):
+        # 예전 PEFT 는 PeftModel 에 delete_adapter 가 없다
+        owner = model if hasattr(model, "delete_adapter") else model.base_model
+        owner.delete_adapter(name)
+
+    def _reset_active(self, model):
+        # 활성 어댑터를 지우면 PEFT 가 남은 어댑터 중 하나로 바꾸거나 비워두고, load_adapter 는 새 어댑터를 켜지 않는다
+        # 실행 중인 생성이 없을 때(_exclusive 안)만 호출되므로 기본 어댑터로 되돌려 current 와 맞춘다
+        default = self.default_name()
+        model.set_adapter(default)
+        self.current = default
+
+    def _clear_caches(self):
+        # 같은 이름의 어댑터가 바뀌었을 수 있으므로 이전 KV 와 답변은 버린다
+        for cache in (get_prefix_cache(), get_answer_cache()):
+            if cache is not None:
+                cache.clear()
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_adapter_registry():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = AdapterRegistry()
+    return _registry
+
+
+def use_adapter(name=None):
+    # with use_adapter(name): 블록 안에서 모델의 활성 어댑터가 name 으로 고정된다
+    return get_adapter_registry().use(name)
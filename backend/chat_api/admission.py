@@ -0,0 +1,147 @@
+# chat_api/admission.py
+# 생성 앞단의 입장 제어 : 동시에 생성하는 요청 수를 제한하고, 나머지는 크기가 정해진 대기열에서 기다린다
+#  - 대기열이 가득 차면 바로 거절 (503 + Retry-After)
+#  - 대기 중에 마감 시간이 지나거나 클라이언트가 떠나면 생성하지 않고 대기열에서 빠진다
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from django.conf import settings
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueueFull(AdmissionRejected):
+    pass
+
+
+class DeadlineExceeded(AdmissionRejected):
+    pass
+
+
+class AdmissionController:
+    def __init__(self, max_active=4, max_queue=16, deadline=30.0):
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self.active = 0
+        self.waiting = deque()
+        self.cond = threading.Condition()
+        self.service_time = None  # 생성 한 건의 평균 소요 시간 (지수 이동 평균), Retry-After 추정용
+        self.stats = {'admitted': 0, 'rejected': 0, 'expired': 0, 'cancelled': 0}
+
+    def retry_after(self):
+        # 지금 대기열이 다 빠지는 데 걸릴 시간(초)의 추정치
+        with self.cond:
+            return self._retry_after()
+
+    def _retry_after(self):
+        per_request = self.service_time or 1.0
+        return max(1, math.ceil(per_request * (len(self.waiting) + 1) / self.max_active))
+
+    def check(self):
+        # 자리를 잡지 않고 대기열이 가득 찼는지만 확인 (스트리밍 응답을 시작하기 전에 거절할 때)
+        with self.cond:
+            if len(self.waiting) >= self.max_queue:
+                self.stats['rejected'] += 1
+                raise QueueFull("대기열이 가득 찼습니다", self._retry_after())
+
+    def acquire(self, cancel_event=None):
+        # 생성할 차례가 되면 (대기 시간, 입장 시점의 대기열 길이) 반환
+        start = time.time()
+        deadline = start + self.deadline
+        ticket = object()
+        with self.cond:
+            depth = len(self.waiting)
+            if self.active < self.max_active and not self.waiting:
+                self.active += 1
+                self.stats['admitted'] += 1
+                return 0.0, depth
+            if depth >= self.max_queue:
+                self.stats['rejected'] += 1
+                raise QueueFull("대기열이 가득 찼습니다", self._retry_after())
+
+            self.waiting.append(ticket)
+            try:
+                while not (self.waiting[0] is ticket and self.active < self.max_active):
+                    if cancel_event is not None and cancel_event.is_set():
+                        self.stats['cancelled'] += 1
+                        raise DeadlineExceeded("요청이 취소되었습니다", self._retry_after())
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        self.stats['expired'] += 1
+                        raise DeadlineExceeded(f"대기 시간이 {self.deadline}초를 넘었습니다", self._retry_after())
+                    # 취소는 알림이 오지 않으므로 짧게 나눠서 기다린다
+                    self.cond.wait(min(remaining, 0.1) if cancel_event is not None else remaining)
+            except AdmissionRejected:
+                self.waiting.remove(ticket)
+                self.cond.notify_all()
+                raise
+
+            self.waiting.popleft()
+            self.active += 1
+            self.stats['admitted'] += 1
+            self.cond.notify_all()
+        return time.time() - start, depth
+
+    def release(self, elapsed):
+        with self.cond:
+            self.active -= 1
+            self.service_time = elapsed if self.service_time is None else 0.8 * self.service_time + 0.2 * elapsed
+            self.cond.notify_all()
+
+    @contextmanager
+    def admit(self, cancel_event=None):
+        # with 블록 안에서 생성. {'queue_wait', 'queue_depth'} 를 넘긴다
+        wait, depth = self.acquire(cancel_event)
+        start = time.time()
+        try:
+            yield {'queue_wait': wait, 'queue_depth': depth}
+        finally:
+            self.release(time.time() - start)
+
+    def get_stats(self):
+        with self.cond:
+            return {**self.stats, 'active': self.active, 'queued': len(self.waiting),
+                    'max_active': self.max_active, 'max_queue': self.max_queue}
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def _max_active():
+    # CHAT_ADMISSION_MAX_ACTIVE 가 None 이면 스케줄러가 켜져 있을 때 배치 크기, 아니면 4
+    # 배치 크기보다 작으면 배치가 끝까지 차지 않는다
+    max_active = getattr(settings, 'CHAT_ADMISSION_MAX_ACTIVE', None)
+    if getattr(settings, 'CHAT_SCHEDULER', 'none') not in ('batch', 'continuous'):
+        return 4 if max_active is None else max_active
+    batch_size = getattr(settings, 'CHAT_BATCH_MAX_SIZE', 8)
+    if max_active is None:
+        return batch_size
+    if max_active < batch_size:
+        print(f"[WARN] CHAT_ADMISSION_MAX_ACTIVE({max_active}) 가 CHAT_BATCH_MAX_SIZE({batch_size}) 보다 작아 "
+              f"배치가 다 차지 않습니다")
+    return max_active
+
+
+def get_admission_controller():
+    # CHAT_ADMISSION_ENABLED 가 꺼져 있으면 None
+    # 제한은 이 프로세스 안에서만 센다. 추론 서버 모드면 Django 워커마다 따로 걸리므로 서버에는 (워커 수 × max_active) 까지 들어간다
+    global _controller
+    if not getattr(settings, 'CHAT_ADMISSION_ENABLED', True):
+        return None
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController(
+                max_active=_max_active(),
+                max_queue=getattr(settings, 'CHAT_ADMISSION_MAX_QUEUE', 16),
+                deadline=getattr(settings, 'CHAT_ADMISSION_DEADLINE', 30.0),
+            )
+    return _controller
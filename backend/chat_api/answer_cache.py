@@ -0,0 +1,78 @@
+# chat_api/answer_cache.py
+# 의미가 같은 질문(임베딩 코사인 유사도 CHAT_ANSWER_CACHE_SIMILARITY 이상) + 같은 RAG 문맥이면 저장된 답변을 재사용
+# 임베딩은 단위 벡터로 바꿔서 비교하므로 인덱스가 정규화됐는지와 상관없이 임계값의 의미가 같다
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+
+def _unit(vec):
+    vec = np.asarray(vec, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+class SemanticAnswerCache:
+    def __init__(self, maxsize=512, min_similarity=0.97):
+        self.maxsize = maxsize
+        self.min_similarity = min_similarity  # 코사인 유사도. 조사/어순만 다른 질문은 보통 0.97 이상
+        self.entries = OrderedDict()      # 키 → {'vec', 'context', 'result'}
+        self.lock = threading.Lock()
+        self.next_key = 0
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def lookup(self, vec, context):
+        # (저장된 결과, 유사도) 또는 (None, None)
+        vec = _unit(vec)
+        with self.lock:
+            candidates = [(key, entry) for key, entry in self.entries.items() if entry['context'] == context]
+            if candidates:
+                matrix = np.stack([entry['vec'] for _, entry in candidates])
+                similarities = matrix @ vec
+                best = int(similarities.argmax())
+                if similarities[best] >= self.min_similarity:
+                    key, entry = candidates[best]
+                    self.entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return entry['result'], float(similarities[best])
+            self.stats['misses'] += 1
+            return None, None
+
+    def put(self, vec, context, result):
+        # 취소되었거나 중간에 잘린 답변은 저장하지 않는다
+        if result.get('stop_reason') in ('cancelled', 'max_tokens'):
+            return
+        vec = _unit(vec)
+        with self.lock:
+            self.entries[self.next_key] = {'vec': vec, 'context': tuple(context), 'result': dict(result)}
+            self.next_key += 1
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get_stats(self):
+        with self.lock:
+            return {**self.stats, 'size': len(self.entries), 'maxsize': self.maxsize}
+
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    # CHAT_ANSWER_CACHE_ENABLED 가 꺼져 있으면 None
+    global _answer_cache
+    if not getattr(settings, 'CHAT_ANSWER_CACHE_ENABLED', False):
+        return None
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            _answer_cache = SemanticAnswerCache(
+                maxsize=getattr(settings, 'CHAT_ANSWER_CACHE_SIZE', 512),
+                min_similarity=getattr(settings, 'CHAT_ANSWER_CACHE_SIMILARITY', 0.97),
+            )
+    return _answer_cache
@@ -1,5 +1,7 @@
 from django.apps import AppConfig
+from django.conf import settings
 import os
+import sys
 import torch
 import gc
 
@@ -13,11 +15,24 @@ class ChatApiConfig(AppConfig):
         if torch.cuda.is_available():
             torch.cuda.empty_cache()
 
-        # ❗ 코드 변경 감지 프로세스에서는 모델 로딩 생략
-        if os.environ.get('RUN_MAIN') != 'true':
-            print("[WARN] RUN_MAIN 아님: 모델 로딩 생략")
+        # ❗ manage.py 로 실행했을 때는 runserver 의 실제 서버 프로세스에서만 로딩
+        #    (코드 변경 감지 프로세스, migrate 등 다른 명령에서는 생략)
+        #    (--noreload 면 감지 프로세스 없이 이 프로세스가 바로 서버)
+        if os.path.basename(sys.argv[0]) == 'manage.py':
+            serving = os.environ.get('RUN_MAIN') == 'true' or '--noreload' in sys.argv
+            if sys.argv[1:2] != ['runserver'] or not serving:
+                print("[WARN] RUN_MAIN 아님: 모델 로딩 생략")
+                return
+
+        if getattr(settings, 'CHAT_INFERENCE_SERVER', False):
+            print("[INFO] 추론 서버 모드: 모델은 inference_server 프로세스에서 로딩")
+            return
+
+        if not getattr(settings, 'CHAT_WARMUP_ON_STARTUP', True):
+            print("[INFO] 워밍업 비활성화: 첫 요청에서 모델 로딩")
             return
 
-        print("[INFO] 모델 로딩 시작")
-        from . import llama_loader
-        llama_loader.load_model()
+        # 서버 기동을 막지 않도록 백그라운드에서 로딩 + 워밍업 (gunicorn/uvicorn 워커 포함)
+        print("[INFO] 모델 백그라운드 워밍업 시작")
+        from . import warmup
+        warmup.start_warmup()
@@ -0,0 +1,93 @@
+# chat_api/batching.py
+# 짧은 시간 창 안에 들어온 요청을 모아 한 번의 model.generate 로 처리하는 배치 스케줄러
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+
+from .adapters import get_adapter_registry, use_adapter
+from .generation import generate_batch
+from .llama_loader import get_model_and_tokenizer
+
+
+class BatchScheduler:
+    def __init__(self, window_ms=20, max_batch_size=8):
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="batch-scheduler", daemon=True)
+        self.thread.start()
+
+    def submit(self, prompt, cancel_event=None, adapter=None):
+        # 결과는 {'text', 'stop_reason', 'generated_tokens', 'preprocess', 'generation', 'batch_size'} 형태로 Future 에 담긴다
+        # cancel_event 가 배치 시작 전에 set 되면 생성하지 않고 Future 를 취소한다
+        # adapter : LoRA 어댑터 이름. 한 번의 generate 는 같은 어댑터 요청끼리만 묶는다
+        adapter = get_adapter_registry().resolve(adapter)  # None 도 기본 어댑터 이름으로 묶이도록
+        future = Future()
+        self.queue.put((prompt, future, cancel_event, adapter))
+        return future
+
+    def _collect(self):
+        # 첫 요청이 올 때까지 대기한 뒤, 시간 창 동안 최대 max_batch_size 까지 모은다
+        batch = [self.queue.get()]
+        deadline = time.time() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            groups = {}  # 어댑터 이름 → [(prompt, future)], 먼저 들어온 어댑터부터
+            for prompt, future, cancel_event, adapter in self._collect():
+                if cancel_event is not None and cancel_event.is_set():
+                    future.cancel()
+                if future.set_running_or_notify_cancel():
+                    groups.setdefault(adapter, []).append((prompt, future))
+            for adapter, batch in groups.items():
+                self._generate(adapter, batch)
+
+    def _generate(self, adapter, batch):
+        try:
+            tokenizer, model = get_model_and_tokenizer()
+            with use_adapter(adapter):
+                results, timing = generate_batch(tokenizer, model, [prompt for prompt, _ in batch], adapter=adapter)
+        except Exception as e:
+            print(f"[ERROR] 배치 생성 실패 : {e}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for result, (_, future) in zip(results, batch):
+            future.set_result({**timing, **result, 'batch_size': len(batch)})
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    # CHAT_SCHEDULER 가 "batch" 면 BatchScheduler, "continuous" 면 ContinuousBatchingEngine, 그 외는 None
+    global _scheduler
+    mode = getattr(settings, 'CHAT_SCHEDULER', 'none')
+    if mode not in ('batch', 'continuous'):
+        return None
+
+    with _scheduler_lock:
+        if _scheduler is None:
+            max_batch_size = getattr(settings, 'CHAT_BATCH_MAX_SIZE', 8)
+            if mode == 'continuous':
+                from .engine import ContinuousBatchingEngine
+                _scheduler = ContinuousBatchingEngine(max_batch_size=max_batch_size)
+            else:
+                _scheduler = BatchScheduler(
+                    window_ms=getattr(settings, 'CHAT_BATCH_WINDOW_MS', 20),
+                    max_batch_size=max_batch_size,
+                )
+    return _scheduler
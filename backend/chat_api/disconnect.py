@@ -0,0 +1,49 @@
+# chat_api/disconnect.py
+# Django 4.2 ASGI 핸들러는 요청 본문을 다 읽은 뒤로는 http.disconnect 를 보지 않는다.
+# 이 ASGI 미들웨어가 대신 감시하다가 클라이언트가 끊으면 scope[DISCONNECT_SCOPE_KEY] 이벤트를 set 한다.
+import asyncio
+
+DISCONNECT_SCOPE_KEY = "chat_api.disconnected"
+
+
+class DisconnectWatcherMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        disconnected = asyncio.Event()
+        scope[DISCONNECT_SCOPE_KEY] = disconnected
+        body_done = False
+        watcher = None
+
+        async def watch():
+            # 본문을 다 받은 뒤 서버가 넘겨주는 다음 메시지는 http.disconnect 뿐이다
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+                    return
+
+        async def wrapped_receive():
+            nonlocal body_done, watcher
+            if body_done:
+                # 본문 이후에 Django 가 receive 를 부르면 감시 태스크와 경쟁하지 않도록 이벤트로 대신 기다린다
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                disconnected.set()
+            elif not message.get("more_body", False):
+                body_done = True
+                watcher = asyncio.ensure_future(watch())
+            return message
+
+        try:
+            await self.app(scope, wrapped_receive, send)
+        finally:
+            if watcher is not None:
+                watcher.cancel()
@@ -0,0 +1,263 @@
+# chat_api/engine.py
+# 토큰 단위로 요청을 합류/이탈시키는 continuous batching 디코드 엔진
+# model.generate 대신 prefill / decode 를 직접 돌리면서 시퀀스별 KV cache 슬롯(배치의 행)을 관리한다
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import torch
+from transformers import DynamicCache
+
+from .adapters import get_adapter_registry
+from .generation import build_generation_config, encode_prompt
+from .llama_loader import get_model_and_tokenizer
+from .stopping import StopPolicy
+
+
+def _pad_left(tensor, length, dim):
+    missing = length - tensor.shape[dim]
+    if missing <= 0:
+        return tensor
+    shape = list(tensor.shape)
+    shape[dim] = missing
+    return torch.cat([tensor.new_zeros(shape), tensor], dim=dim)
+
+
+def _to_legacy(cache):
+    # 레이어별 (key, value) 튜플 : [batch, heads, length, head_dim]
+    return cache.to_legacy_cache() if hasattr(cache, "to_legacy_cache") else cache
+
+
+class _Sequence:
+    def __init__(self, prompt, future, cancel_event=None):
+        self.prompt = prompt
+        self.future = future
+        self.cancel_event = cancel_event
+        self.token_ids = []
+        self.stop_reason = None
+        self.preprocess = 0.0
+        self.started_at = None
+        self.first_token_at = None  # prefill 이 끝나 첫 토큰이 나온 시각 (prefill / decode 구간 구분용)
+        self.prompt_tokens = 0      # 패딩을 뺀 프롬프트 토큰 수
+        self.peak_batch_size = 0
+
+
+class ContinuousBatchingEngine:
+    def __init__(self, max_batch_size=8):
+        self.max_batch_size = max_batch_size
+        self.waiting = queue.Queue()
+        self.deferred = deque()     # 실행 중인 배치와 어댑터가 달라 배치가 빌 때까지 미룬 요청
+        self.adapter = None         # 실행 중인 배치의 LoRA 어댑터 (배치가 도는 동안 레지스트리에서 잡고 있다)
+        self.active = []            # self.active[i] 는 KV cache 의 i 번째 행을 사용
+        self.past = None            # 레이어별 (key, value), 왼쪽 패딩으로 길이를 맞춘 배치 캐시
+        self.attention_mask = None  # [batch, length], 패딩 위치는 0
+        self.tokenizer = None
+        self.model = None
+        self.generation_config = None
+        self.stop_policy = None
+        self.thread = threading.Thread(target=self._run, name="continuous-batching", daemon=True)
+        self.thread.start()
+
+    def submit(self, prompt, cancel_event=None, adapter=None):
+        # 결과는 {'text', 'stop_reason', 'generated_tokens', 'preprocess', 'generation', 'prefill', 'decode',
+        #         'prompt_tokens', 'batch_size'} 형태로 Future 에 담긴다
+        # cancel_event 가 set 되면 다음 토큰 경계에서 stop_reason='cancelled' 로 배치에서 빠진다
+        # adapter : LoRA 어댑터 이름. 배치 안의 시퀀스는 모두 같은 어댑터를 쓴다
+        # 어댑터 이름은 여기서 확정한다 (None 과 기본 어댑터 이름이 다른 어댑터로 보이지 않도록, 없는 이름은 바로 UnknownAdapter)
+        adapter = get_adapter_registry().resolve(adapter)
+        future = Future()
+        self.waiting.put((prompt, future, cancel_event, adapter))
+        return future
+
+    def _run(self):
+        while True:
+            try:
+                self._admit(block=not self.active)
+                self._evict()
+                if self.active:
+                    self._step()
+            except Exception as e:
+                print(f"[ERROR] continuous batching 실패 : {e}")
+                for seq in self.active:
+                    if not seq.future.done():
+                        seq.future.set_exception(e)
+                self.active = []
+                self.past = None
+                self.attention_mask = None
+                self._release_adapter()
+
+    def _release_adapter(self):
+        # 배치가 비면 어댑터를 놓아 다른 어댑터 요청이나 어댑터 로딩이 진행될 수 있게 한다
+        if self.adapter is not None:
+            get_adapter_registry().release()
+            self.adapter = None
+
+    def _ensure_model(self):
+        if self.model is None:
+            self.tokenizer, self.model = get_model_and_tokenizer()
+            self.generation_config = build_generation_config(self.tokenizer)
+            self.stop_policy = StopPolicy.from_settings(self.tokenizer)
+
+    # ===== 합류 : 대기 중인 요청을 prefill 해서 실행 중인 배치에 붙인다 =====
+    def _take_deferred(self):
+        # 미뤄둔 요청 중 지금 배치와 어댑터가 같은 (배치가 비었으면 가장 오래된) 요청
+        for n, item in enumerate(self.deferred):
+            if self.adapter is None or item[3] == self.adapter:
+                del self.deferred[n]
+                return item
+        return None
+
+    def _admit(self, block):
+        registry = get_adapter_registry()
+        new = []
+        while len(self.active) + len(new) < self.max_batch_size:
+            item = self._take_deferred()
+            if item is None:
+                # 다른 어댑터 요청이 기다리고 있으면 더 합류시키지 않고 지금 배치가 끝나길 기다린다
+                if self.adapter is not None and (self.deferred or registry.contended(self.adapter)):
+                    break
+                try:
+                    item = self.waiting.get(block=block and not new)
+                except queue.Empty:
+                    break
+            prompt, future, cancel_event, adapter = item
+            if self.adapter is not None and adapter != self.adapter:
+                self.deferred.append(item)
+                continue
+            if cancel_event is not None and cancel_event.is_set():
+                future.cancel()
+            if not future.set_running_or_notify_cancel():
+                continue
+            if self.adapter is None:
+                try:
+                    self.adapter = registry.acquire(adapter)
+                except Exception as e:
+                    # 대기하는 동안 어댑터가 내려간 경우
+                    future.set_exception(e)
+                    continue
+            new.append(_Sequence(prompt, future, cancel_event))
+        if not new:
+            return
+
+        try:
+            self._ensure_model()
+            self._prefill(new)
+        except Exception as e:
+            for seq in new:
+                seq.future.set_exception(e)
+            raise
+
+    def _prefill(self, new):
+        start = time.time()
+        inputs = encode_prompt(self.tokenizer, self.model, [seq.prompt for seq in new])
+        mask = inputs["attention_mask"]
+        end_preprocess = time.time()
+
+        # 왼쪽 패딩이므로 position 은 실제 토큰 기준으로 계산
+        position_ids = (mask.cumsum(-1) - 1).clamp(min=0)
+        with torch.no_grad():
+            out = self.model(input_ids=inputs["input_ids"], attention_mask=mask,
+                             position_ids=position_ids, use_cache=True)
+        next_tokens = self._sample(out.logits[:, -1, :]).tolist()
+        first_token_at = time.time()
+
+        for seq, token, prompt_tokens in zip(new, next_tokens, mask.sum(-1).tolist()):
+            seq.preprocess = end_preprocess - start
+            seq.started_at = end_preprocess
+            seq.first_token_at = first_token_at
+            seq.prompt_tokens = prompt_tokens
+            seq.token_ids.append(token)
+        self._merge(new, _to_legacy(out.past_key_values), mask)
+
+    def _merge(self, new, past, mask):
+        if not self.active:
+            self.past, self.attention_mask = past, mask
+        else:
+            length = max(self.attention_mask.shape[1], mask.shape[1])
+            self.past = tuple(
+                (torch.cat([_pad_left(k, length, 2), _pad_left(new_k, length, 2)]),
+                 torch.cat([_pad_left(v, length, 2), _pad_left(new_v, length, 2)]))
+                for (k, v), (new_k, new_v) in zip(self.past, past)
+            )
+            self.attention_mask = torch.cat([_pad_left(self.attention_mask, length, 1), _pad_left(mask, length, 1)])
+        self.active.extend(new)
+
+    # ===== 디코드 : 실행 중인 모든 시퀀스에 대해 토큰 하나씩 생성 =====
+    def _step(self):
+        batch_size = len(self.active)
+        input_ids = torch.tensor([[seq.token_ids[-1]] for seq in self.active], device=self.attention_mask.device)
+        position_ids = self.attention_mask.sum(-1, keepdim=True)
+        self.attention_mask = torch.cat([self.attention_mask, self.attention_mask.new_ones((batch_size, 1))], dim=1)
+
+        with torch.no_grad():
+            out = self.model(input_ids=input_ids, attention_mask=self.attention_mask, position_ids=position_ids,
+                             past_key_values=DynamicCache.from_legacy_cache(self.past), use_cache=True)
+        self.past = _to_legacy(out.past_key_values)
+
+        for seq, token in zip(self.active, self._sample(out.logits[:, -1, :]).tolist()):
+            seq.token_ids.append(token)
+            seq.peak_batch_size = max(seq.peak_batch_size, batch_size)
+
+    def _sample(self, logits):
+        config = self.generation_config
+        if not config.do_sample:
+            return logits.argmax(-1)
+        logits = logits.float() / config.temperature
+        if config.top_k:
+            kth = torch.topk(logits, min(config.top_k, logits.shape[-1])).values[:, -1:]
+            logits = logits.masked_fill(logits < kth, float("-inf"))
+        return torch.multinomial(torch.softmax(logits, dim=-1), 1).squeeze(-1)
+
+    # ===== 이탈 : 끝난 시퀀스는 바로 결과를 돌려주고 KV cache 슬롯을 비운다 =====
+    def _is_finished(self, seq):
+        if seq.stop_reason is None and seq.cancel_event is not None and seq.cancel_event.is_set():
+            seq.stop_reason = 'cancelled'
+        if seq.stop_reason is None:
+            seq.stop_reason = self.stop_policy.reason(seq.token_ids)
+        if seq.stop_reason is None and len(seq.token_ids) >= self.generation_config.max_new_tokens:
+            seq.stop_reason = 'max_tokens'
+        return seq.stop_reason is not None
+
+    def _evict(self):
+        keep = []
+        for row, seq in enumerate(self.active):
+            if self._is_finished(seq):
+                self._finish(seq)
+            else:
+                keep.append(row)
+        if len(keep) == len(self.active):
+            return
+
+        self.active = [self.active[row] for row in keep]
+        if not keep:
+            self.past = None
+            self.attention_mask = None
+            self._release_adapter()
+            return
+
+        index = torch.tensor(keep, device=self.attention_mask.device)
+        mask = self.attention_mask.index_select(0, index)
+        # 남은 시퀀스 모두에게 패딩인 앞쪽 열은 잘라낸다
+        start = int((mask.sum(0) == 0).long().cumprod(0).sum())
+        self.attention_mask = mask[:, start:]
+        self.past = tuple(
+            (k.index_select(0, index)[:, :, start:], v.index_select(0, index)[:, :, start:])
+            for k, v in self.past
+        )
+
+    def _finish(self, seq):
+        text = self.tokenizer.decode(seq.token_ids, skip_special_tokens=True)
+        end = time.time()
+        seq.future.set_result({
+            'text': self.stop_policy.trim(text),
+            'stop_reason': seq.stop_reason,
+            'preprocess': seq.preprocess,
+            'generation': end - seq.started_at,
+            'prefill': seq.first_token_at - seq.started_at,
+            'decode': end - seq.first_token_at,
+            'prompt_tokens': seq.prompt_tokens,
+            'batch_size': max(seq.peak_batch_size, 1),
+            'generated_tokens': len(seq.token_ids),
+        })
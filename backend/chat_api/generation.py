@@ -0,0 +1,205 @@
+# chat_api/generation.py
+# chat_test / chat_stream / 배치 스케줄러 / 추론 서버가 공유하는 생성 설정 및 전처리
+import time
+from threading import Event, Thread
+
+import torch
+from transformers import GenerationConfig, StoppingCriteriaList, TextIteratorStreamer
+
+from . import profiling
+from .adapters import get_adapter_registry, use_adapter
+from .llama_loader import get_model_and_tokenizer, get_tokenizer
+from .prefix_cache import get_prefix_cache
+from .speculative import AcceptanceCounter, generate_kwargs
+from .stopping import PolicyStoppingCriteria, StopPolicy
+
+MAX_INPUT_LENGTH = 1024
+PROMPT_MARGIN_TOKENS = 8  # 조각별로 센 토큰 수와 전체를 한 번에 토크나이즈한 수가 경계에서 조금 다를 수 있다
+PROMPT_TOKEN_BUDGET = MAX_INPUT_LENGTH - PROMPT_MARGIN_TOKENS  # 조립된 프롬프트가 잘리지 않도록 query_rag 에 넘기는 예산
+
+
+def build_generation_config(tokenizer):
+    return GenerationConfig(
+        temperature=0.1,               # [샘플링 온도] 낮을수록 결정적 → 항상 비슷한 답변 생성됨 (0에 가까우면 거의 greedy)
+        top_k=50,                       # [상위 k 토큰 제한] 확률이 가장 높은 1개의 토큰만 후보로 사용 (탐색 범위 축소)
+        do_sample=True,              # [샘플링 여부] False면 확률이 가장 높은 토큰을 항상 선택 (deterministic)
+        max_new_tokens=150,             # [최대 생성 토큰 수] 답변의 최대 길이를 제한
+        eos_token_id=tokenizer.eos_token_id,
+        pad_token_id=tokenizer.pad_token_id
+    )
+
+
+def encode_prompt(tokenizer, model, prompt):
+    # prompt 는 문자열 하나 또는 리스트. 배치일 때 생성 위치를 맞추기 위해 왼쪽 패딩
+    inputs = tokenizer(prompt, return_tensors="pt", padding=True, truncation=True,
+                       max_length=MAX_INPUT_LENGTH, padding_side="left")
+    return {k: v.to(model.device) for k, v in inputs.items()}
+
+
+def count_tokens(text):
+    # query_rag 의 프롬프트 조립이 토큰 예산을 셀 때 쓰는 함수 (BOS 등 특수 토큰 제외)
+    return len(get_tokenizer()(text, add_special_tokens=False)["input_ids"])
+
+
+def _resume_prefix(tokenizer, model, inputs, prefix, adapter=None):
+    # 한 건짜리 요청이고 prefix 가 있으면 접두어 KV 캐시에서 이어서 생성. (generate 추가 인자, 재사용 토큰 수)
+    cache = get_prefix_cache()
+    if prefix is None or cache is None or inputs["input_ids"].shape[0] != 1:
+        return {}, 0
+    past, reused = cache.lookup(tokenizer, model, prefix, inputs["input_ids"], adapter)
+    return ({'past_key_values': past} if past is not None else {}), reused
+
+
+def _split_generation(criteria, start_gen, end_gen, prefix_prefill=0.0):
+    # generation 을 첫 토큰까지(prefill)와 나머지(decode)로 나눈다
+    # prefix_prefill : generate 전에 접두어 캐시를 채우느라 쓴 시간 (캐시 미스일 때), prefill 과 generation 에 포함
+    first = criteria.first_token_at or end_gen
+    return {'generation': end_gen - start_gen + prefix_prefill,
+            'prefill': first - start_gen + prefix_prefill, 'decode': end_gen - first}
+
+
+def generate_batch(tokenizer, model, prompts, generation_config=None, stop_policy=None, cancel_event=None,
+                   prefix=None, adapter=None):
+    # prompts 를 한 번의 model.generate 로 처리하고
+    # ([{'text', 'stop_reason', 'generated_tokens'}, ...], timing) 반환
+    # prefix : 프롬프트가 한 건일 때 KV 캐시를 재사용할 공통 앞부분 (헤더 + RAG 문맥)
+    # adapter : 지금 활성화된 LoRA 어댑터 이름 (접두어 캐시 키). 어댑터 전환은 호출하는 쪽에서 use_adapter 로
+    start_preprocess = time.time()
+    inputs = encode_prompt(tokenizer, model, prompts)
+    end_preprocess = time.time()
+    resume, reused = _resume_prefix(tokenizer, model, inputs, prefix, adapter)
+    prefix_prefill = time.time() - end_preprocess
+
+    if generation_config is None:
+        generation_config = build_generation_config(tokenizer)
+    if stop_policy is None:
+        stop_policy = StopPolicy.from_settings(tokenizer)
+
+    # 왼쪽 패딩이므로 모든 행의 프롬프트 길이가 같다
+    prompt_length = inputs["input_ids"].shape[1]
+    criteria = PolicyStoppingCriteria(stop_policy, prompt_length, cancel_event)
+    speculative = generate_kwargs(model, len(prompts))
+
+    start_gen = time.time()
+    with torch.no_grad(), AcceptanceCounter(model) as counter:
+        output_ids = model.generate(**inputs, **resume, **speculative, generation_config=generation_config,
+                                    stopping_criteria=StoppingCriteriaList([criteria]))
+    end_gen = time.time()
+
+    generated = output_ids[:, prompt_length:]
+    results = []
+    for row in range(generated.shape[0]):
+        stop_reason, length = criteria.result(row, generated.shape[1])
+        text = tokenizer.decode(generated[row, :length], skip_special_tokens=True)
+        results.append({
+            'text': stop_policy.trim(text),
+            'stop_reason': stop_reason,
+            'generated_tokens': length,
+        })
+
+    timing = {
+        'preprocess': end_preprocess - start_preprocess,
+        **_split_generation(criteria, start_gen, end_gen, prefix_prefill),
+        'prompt_tokens': prompt_length,
+        'cached_prefix_tokens': reused,
+    }
+    if speculative:
+        timing.update(counter.stats(generated.shape[1]))
+    return results, timing
+
+
+def stream_generate(tokenizer, model, prompt, generation_config=None, stop_policy=None, prefix=None, adapter=None):
+    # 생성은 워커 스레드에서 돌리고, 디코딩된 텍스트 조각을 ('token', text) 로 넘긴다
+    # 마지막에 ('done', {'text', 'stop_reason', 'generated_tokens', 'preprocess', 'generation'}) 를 넘긴다
+    start_preprocess = time.time()
+    inputs = encode_prompt(tokenizer, model, prompt)
+    end_preprocess = time.time()
+    resume, reused = _resume_prefix(tokenizer, model, inputs, prefix, adapter)
+    prefix_prefill = time.time() - end_preprocess
+
+    if generation_config is None:
+        generation_config = build_generation_config(tokenizer)
+    if stop_policy is None:
+        stop_policy = StopPolicy.from_settings(tokenizer)
+
+    prompt_length = inputs["input_ids"].shape[1]
+    stop_event = Event()  # 소비하는 쪽이 중간에 그만두면 set
+    criteria = PolicyStoppingCriteria(stop_policy, prompt_length, stop_event)
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+    speculative = generate_kwargs(model, 1)
+    output = {}
+
+    def generate():
+        try:
+            # 카운터는 forward 가 실행되는 이 스레드에 걸어야 한다
+            with torch.no_grad(), AcceptanceCounter(model) as counter:
+                output['ids'] = model.generate(**inputs, **resume, **speculative, generation_config=generation_config,
+                                               stopping_criteria=StoppingCriteriaList([criteria]),
+                                               streamer=streamer)
+            output['counter'] = counter
+        except Exception as e:
+            # streamer 를 닫아주지 않으면 소비하는 쪽이 영원히 기다린다
+            output['error'] = e
+            streamer.end()
+
+    start_gen = time.time()
+    thread = Thread(target=profiling.bind(generate), daemon=True)
+    thread.start()
+    try:
+        for chunk in streamer:
+            if chunk:
+                yield 'token', chunk
+    finally:
+        # 클라이언트가 끊겨 제너레이터가 닫히면 다음 토큰 경계에서 생성을 멈추고, 실제로 끝날 때까지 기다린다
+        # (그 전에 돌아가면 호출한 쪽이 어댑터 / 입장 제어 자리를 놓는데 생성은 계속 돈다)
+        if thread.is_alive():
+            stop_event.set()
+        thread.join()
+    end_gen = time.time()
+
+    if 'error' in output:
+        raise output['error']
+
+    generated = output['ids'][0, prompt_length:]
+    stop_reason, length = criteria.result(0, generated.shape[0])
+    text = tokenizer.decode(generated[:length], skip_special_tokens=True)
+    result = {
+        'text': stop_policy.trim(text),
+        'stop_reason': stop_reason,
+        'generated_tokens': length,
+        'preprocess': end_preprocess - start_preprocess,
+        **_split_generation(criteria, start_gen, end_gen, prefix_prefill),
+        'prompt_tokens': prompt_length,
+        'cached_prefix_tokens': reused,
+    }
+    if speculative:
+        result.update(output['counter'].stats(generated.shape[0]))
+    yield 'done', result
+
+
+def generate_local(prompt, cancel_event=None, prefix=None, adapter=None):
+    # 이 프로세스에 올라온 모델로 생성. 스케줄러가 켜져 있으면 다른 요청과 묶어서 처리 (배치는 접두어 캐시를 쓰지 않는다)
+    # adapter : LoRA 어댑터 이름, None 이면 기본 어댑터. 없는 이름이면 UnknownAdapter
+    # 결과는 {'text', 'stop_reason', 'generated_tokens', 'preprocess', 'generation', 'adapter'[, 'batch_size']}
+    from .batching import get_scheduler
+
+    adapter = get_adapter_registry().resolve(adapter)
+    scheduler = get_scheduler()
+    if scheduler is not None:
+        result = scheduler.submit(prompt, cancel_event=cancel_event, adapter=adapter).result()
+        return {**result, 'adapter': adapter}
+
+    tokenizer, model = get_model_and_tokenizer()
+    with use_adapter(adapter):
+        results, timing = generate_batch(tokenizer, model, [prompt], cancel_event=cancel_event, prefix=prefix,
+                                         adapter=adapter)
+    return {**timing, **results[0], 'adapter': adapter}
+
+
+def stream_local(prompt, prefix=None, adapter=None):
+    # 스트림이 끝날 때까지 어댑터를 붙잡고 있는다 (그 사이 다른 어댑터 요청은 대기)
+    adapter = get_adapter_registry().resolve(adapter)
+    tokenizer, model = get_model_and_tokenizer()
+    with use_adapter(adapter):
+        for event, data in stream_generate(tokenizer, model, prompt, prefix=prefix, adapter=adapter):
+            yield event, ({**data, 'adapter': adapter} if event == 'done' else data)
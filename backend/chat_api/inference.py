@@ -0,0 +1,161 @@
+# chat_api/inference.py
+# 모델은 추론 서버 프로세스 하나만 로딩하고, Django 워커들은 Unix 소켓으로 생성 요청을 보낸다
+#  - 서버 : python manage.py inference_server
+#  - 클라이언트 : generate(prompt) / stream(prompt) / get_status() 는 로컬 generate_local / stream_local 과 같은 형태로 반환
+#  - LoRA 어댑터 목록 / 로딩 / 삭제도 모델을 가진 서버에 맡긴다
+import os
+import threading
+from multiprocessing.connection import Client, Listener
+
+from django.conf import settings
+
+from . import profiling
+from .adapters import UnknownAdapter, get_adapter_registry
+from .generation import generate_local, stream_local
+
+
+_serving = False  # 이 프로세스가 추론 서버 자신인지
+
+
+class InferenceServerError(RuntimeError):
+    pass
+
+
+def is_enabled():
+    # 이 프로세스가 추론 서버에 생성을 맡겨야 하는지
+    return getattr(settings, 'CHAT_INFERENCE_SERVER', False) and not _serving
+
+
+def _address():
+    return str(getattr(settings, 'CHAT_INFERENCE_SOCKET', settings.BASE_DIR / "inference.sock"))
+
+
+def _authkey():
+    return settings.SECRET_KEY.encode("utf-8")
+
+
+# ===== 서버 =====
+def _handle(conn):
+    with conn:
+        while True:
+            try:
+                request = conn.recv()
+            except EOFError:
+                return
+
+            op = request.get('op')
+            try:
+                if op == 'status':
+                    from . import warmup
+                    conn.send({'result': warmup.get_status()})
+                elif op == 'generate':
+                    # Django 워커의 trace 에는 생성이 보이지 않으므로 모델을 가진 이 프로세스에서 따로 남긴다
+                    with profiling.maybe_profile('inference_generate'):
+                        result = generate_local(request['prompt'], prefix=request.get('prefix'),
+                                                adapter=request.get('adapter'))
+                    conn.send({'result': result})
+                elif op == 'stream':
+                    with profiling.maybe_profile('inference_stream'):
+                        for event, data in stream_local(request['prompt'], prefix=request.get('prefix'),
+                                                        adapter=request.get('adapter')):
+                            conn.send({'event': event, 'data': data})
+                elif op == 'adapters':
+                    conn.send({'result': get_adapter_registry().list()})
+                elif op == 'load_adapter':
+                    get_adapter_registry().load(request['name'], request['path'])
+                    conn.send({'result': get_adapter_registry().list()})
+                elif op == 'unload_adapter':
+                    get_adapter_registry().unload(request['name'])
+                    conn.send({'result': get_adapter_registry().list()})
+                else:
+                    conn.send({'error': f"알 수 없는 요청 : {op}"})
+            except (BrokenPipeError, ConnectionResetError):
+                # 클라이언트가 먼저 끊은 경우
+                return
+            except UnknownAdapter as e:
+                conn.send({'error': str(e), 'unknown_adapter': True})
+            except ValueError as e:
+                # 어댑터 로딩 / 삭제 요청이 잘못된 경우 등
+                conn.send({'error': str(e), 'invalid': True})
+            except Exception as e:
+                print(f"[ERROR] 추론 서버 요청 실패 : {e}")
+                conn.send({'error': str(e)})
+
+
+def serve(address=None):
+    from . import warmup
+    global _serving
+    _serving = True
+
+    address = address or _address()
+    if os.path.exists(address):
+        os.unlink(address)
+
+    warmup.start_warmup()
+    with Listener(address, family='AF_UNIX', authkey=_authkey()) as listener:
+        print(f"[INFO] 추론 서버 대기 중 : {address}")
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                print(f"[WARN] 추론 서버 연결 수락 실패 : {e}")
+                continue
+            threading.Thread(target=_handle, args=(conn,), daemon=True).start()
+
+
+# ===== 클라이언트 =====
+def _connect():
+    try:
+        return Client(_address(), family='AF_UNIX', authkey=_authkey())
+    except (OSError, EOFError) as e:
+        raise InferenceServerError(f"추론 서버에 연결할 수 없습니다 : {e}") from e
+
+
+def _raise_error(response):
+    # 요청이 잘못된 경우는 로컬과 같은 예외로 돌려준다 (views 에서 400)
+    if response.get('unknown_adapter'):
+        raise UnknownAdapter(response['error'])
+    if response.get('invalid'):
+        raise ValueError(response['error'])
+    raise InferenceServerError(response['error'])
+
+
+def _request(op, **payload):
+    with _connect() as conn:
+        conn.send({'op': op, **payload})
+        response = conn.recv()
+    if 'error' in response:
+        _raise_error(response)
+    return response['result']
+
+
+def get_status():
+    return _request('status')
+
+
+def generate(prompt, prefix=None, adapter=None):
+    return _request('generate', prompt=prompt, prefix=prefix, adapter=adapter)
+
+
+def stream(prompt, prefix=None, adapter=None):
+    with _connect() as conn:
+        conn.send({'op': 'stream', 'prompt': prompt, 'prefix': prefix, 'adapter': adapter})
+        while True:
+            response = conn.recv()
+            if 'error' in response:
+                _raise_error(response)
+            yield response['event'], response['data']
+            if response['event'] == 'done':
+                return
+
+
+def list_adapters():
+    return _request('adapters')
+
+
+def load_adapter(name, path):
+    return _request('load_adapter', name=name, path=path)
+
+
+def unload_adapter(name):
+    return _request('unload_adapter', name=name)
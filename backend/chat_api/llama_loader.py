@@ -2,10 +2,15 @@
 import torch
 from transformers import AutoTokenizer, AutoModelForCausalLM
 import os
+import shutil
+import hashlib
+import threading
 from pathlib import Path
 from django.conf import settings
 from peft import PeftModel
 
+from .quantization import DTYPES, QUANTIZATION_DTYPES, configure_cpu_threads, quantize_model
+
 # MODEL_NAME = "google/gemma-2b-it"
 # MODEL_NAME = "microsoft/phi
 # MODEL_NAME = "TinyLlama/TinyLlama-1.1B-Chat-v1.0"
@@ -16,34 +21,137 @@ BASE_MODEL_NAME = "google/gemma-2b-it"
 PEFT_MODEL = os.path.join(CURRENT_DIR, "../tools/outputs/gemma2b-it-finetuned-정제")
 ADAPTER_PATH = PEFT_MODEL  # 이 라인 추가해줘용!
 
+MERGED_DIR_PREFIX = "merged-"
+
 tokenizer = None
 model = None
+adapter_paths = {}  # 올라와 있는 LoRA 어댑터 이름 → 경로 (첫 번째가 기본 어댑터)
+_load_lock = threading.Lock()  # 동시에 들어온 첫 요청들이 모델을 중복 로딩하지 않도록
+_tokenizer_only = None
+_tokenizer_lock = threading.Lock()
+
+def adapter_hash(adapter_path=ADAPTER_PATH):
+    # 어댑터 파일(adapter_config.json, adapter_model.*) 내용 기준 해시. 어댑터가 바뀌면 병합본도 새로 만든다
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(adapter_path)):
+        path = os.path.join(adapter_path, name)
+        if not (name.startswith("adapter_") and os.path.isfile(path)):
+            continue
+        digest.update(name.encode("utf-8"))
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()[:16]
+
+def merged_model_path(adapter_path=ADAPTER_PATH):
+    return os.path.join(adapter_path, MERGED_DIR_PREFIX + adapter_hash(adapter_path))
+
+def configured_adapters():
+    # CHAT_ADAPTERS (이름 → 경로) 에서 CHAT_DEFAULT_ADAPTER 를 맨 앞으로. 비어 있으면 ADAPTER_PATH 하나만 사용
+    default = getattr(settings, 'CHAT_DEFAULT_ADAPTER', 'default')
+    adapters = {name: str(path) for name, path in getattr(settings, 'CHAT_ADAPTERS', {}).items()}
+    if not adapters:
+        return {default: ADAPTER_PATH}
+    if default not in adapters:
+        raise ValueError(f"CHAT_DEFAULT_ADAPTER '{default}' 가 CHAT_ADAPTERS 에 없습니다")
+    return {default: adapters.pop(default), **adapters}
+
+def _load_merged_model(torch_dtype=torch.float16, adapter_path=ADAPTER_PATH):
+    # LoRA 를 베이스 가중치에 한 번 병합해서 safetensors 로 저장해 두고, 이후 부팅에서는 그 파일을 바로 mmap 로딩
+    merged_path = merged_model_path(adapter_path)
+    if os.path.exists(os.path.join(merged_path, "config.json")):
+        print(f"[INFO] 병합된 체크포인트 로딩 : {merged_path}")
+        return AutoModelForCausalLM.from_pretrained(merged_path, local_files_only=True, torch_dtype=torch_dtype,
+                                                    low_cpu_mem_usage=True, use_safetensors=True)
+
+    print(f"[INFO] 병합된 체크포인트가 없어 LoRA 병합 후 저장 : {merged_path}")
+    base_model = AutoModelForCausalLM.from_pretrained(BASE_MODEL_NAME, local_files_only=True, torch_dtype=torch.float16)
+    merged = PeftModel.from_pretrained(base_model, adapter_path).merge_and_unload()
+
+    # 저장 도중 죽어도 깨진 체크포인트가 남지 않도록 임시 디렉토리에 쓰고 이름을 바꾼다
+    tmp_path = merged_path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    merged.save_pretrained(tmp_path, safe_serialization=True)
+    os.replace(tmp_path, merged_path)
+
+    # 이전 어댑터로 만든 병합본은 정리
+    for name in os.listdir(adapter_path):
+        path = os.path.join(adapter_path, name)
+        if name.startswith(MERGED_DIR_PREFIX) and path != merged_path:
+            shutil.rmtree(path, ignore_errors=True)
+    return merged.to(torch_dtype)
+
+def build_model(load_mode="peft", dtype="float16", quantization="none", adapters=None):
+    # 설정과 무관하게 모델 하나를 만든다 (벤치마크 스크립트도 사용)
+    # adapters : 이름 → 경로, 첫 번째가 기본 어댑터. 없으면 ADAPTER_PATH 하나
+    # 양자화는 LoRA 가 병합된 가중치에 적용하므로 load_mode 와 상관없이 병합 체크포인트를 쓴다 (기본 어댑터만)
+    adapters = adapters or {'default': ADAPTER_PATH}
+    default_name, default_path = next(iter(adapters.items()))
+    if quantization != "none":
+        torch_dtype = QUANTIZATION_DTYPES.get(quantization, torch.float32)
+        return quantize_model(_load_merged_model(torch_dtype, default_path), quantization)
+    if load_mode == 'merged':
+        return _load_merged_model(DTYPES[dtype], default_path)
+
+    # 베이스 모델은 하나만 올리고 어댑터는 이름을 붙여 여러 개 등록 (어댑터당 수 MB)
+    base_model = AutoModelForCausalLM.from_pretrained(BASE_MODEL_NAME, local_files_only=True, torch_dtype=DTYPES[dtype])
+    peft_model = PeftModel.from_pretrained(base_model, default_path, adapter_name=default_name)
+    for name, path in list(adapters.items())[1:]:
+        peft_model.load_adapter(path, adapter_name=name)
+    peft_model.set_adapter(default_name)
+    return peft_model
 
 def load_model():
-    global tokenizer, model
-    if tokenizer is None or model is None:
-        print(f"[INFO] {PEFT_MODEL} 모델 사전 로딩 중...")
+    global tokenizer, model, adapter_paths
+    with _load_lock:
+        if tokenizer is not None and model is not None:
+            return
+
+        load_mode = getattr(settings, 'CHAT_MODEL_LOAD_MODE', 'peft')
+        dtype = getattr(settings, 'CHAT_MODEL_DTYPE', 'float16')
+        quantization = getattr(settings, 'CHAT_MODEL_QUANTIZATION', 'none')
+        print(f"[INFO] {PEFT_MODEL} 모델 사전 로딩 중... (load_mode={load_mode}, dtype={dtype}, quantization={quantization})")
+        if not torch.cuda.is_available():
+            threads = configure_cpu_threads(getattr(settings, 'CHAT_CPU_THREADS', None))
+            print(f"[INFO] CPU 추론 : 스레드 {threads}개")
 
         # offload_path = os.path.join(settings.BASE_DIR, "offload")
         # os.makedirs(offload_path, exist_ok=True)
 
-        tokenizer = AutoTokenizer.from_pretrained(BASE_MODEL_NAME, local_files_only=True)
-        base_model = AutoModelForCausalLM.from_pretrained(BASE_MODEL_NAME, local_files_only=True, torch_dtype=torch.float16)    
-        model = PeftModel.from_pretrained(base_model, ADAPTER_PATH)
+        new_tokenizer = AutoTokenizer.from_pretrained(BASE_MODEL_NAME, local_files_only=True)
+        adapters = configured_adapters()
+        new_model = build_model(load_mode, dtype, quantization, adapters)
+        if not isinstance(new_model, PeftModel) and len(adapters) > 1:
+            # 병합 / 양자화 모델은 어댑터를 바꿀 수 없다
+            print(f"[WARN] load_mode={load_mode}, quantization={quantization} 에서는 기본 어댑터만 사용")
+            adapters = dict([next(iter(adapters.items()))])
 
         print("----------------")
-        print(type(model))
-        print(model.base_model.model) 
+        print(type(new_model))
         print("----------------")
 
-        if tokenizer.pad_token is None:
-            tokenizer.pad_token = tokenizer.eos_token
+        if new_tokenizer.pad_token is None:
+            new_tokenizer.pad_token = new_tokenizer.eos_token
 
+        # 다른 스레드가 반쯤 준비된 모델을 보지 않도록 마지막에 공개
+        # 다른 스레드는 model 이 None 이 아니면 준비됐다고 보므로(get_model_and_tokenizer 는 락 없이 확인) model 을 맨 마지막에
+        adapter_paths = adapters
+        tokenizer = new_tokenizer
+        model = new_model
         print("[INFO] 모델 로딩 완료 (LoRA 적용됨!)")
 
 def get_model_and_tokenizer():
-    global tokenizer, model
     if tokenizer is None or model is None:
         print("[WARN] 모델이 로딩되지 않아 load_model()을 자동 호출합니다.")
         load_model()
-    return tokenizer, model
\ No newline at end of file
+    return tokenizer, model
+
+def get_tokenizer():
+    # 프롬프트 토큰 수 계산용. 모델을 올리지 않는 프로세스(추론 서버 클라이언트)도 쓸 수 있도록 토크나이저만 로딩
+    global _tokenizer_only
+    if tokenizer is not None:
+        return tokenizer
+    with _tokenizer_lock:
+        if _tokenizer_only is None:
+            _tokenizer_only = AutoTokenizer.from_pretrained(BASE_MODEL_NAME, local_files_only=True)
+    return _tokenizer_only
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from chat_api import inference
+
+
+class Command(BaseCommand):
+    help = "모델을 한 번만 로딩해서 Unix 소켓으로 Django 워커들의 생성 요청을 처리하는 추론 서버"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--socket', default=None, help="Unix 소켓 경로 (기본값: CHAT_INFERENCE_SOCKET)")
+
+    def handle(self, *args, **options):
+        inference.serve(options['socket'])
@@ -0,0 +1,211 @@
+# chat_api/metrics.py
+# /metrics (Prometheus 텍스트 형식) 용 지표. 외부 라이브러리 없이 프로세스 안에서 집계한다
+# 워커 프로세스가 여러 개면 워커마다 따로 집계되므로 Prometheus 쪽에서 합친다
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (8, 16, 32, 64, 128, 256, 512, 1024)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+request_logger = logging.getLogger("chat_api.requests")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.label_names = tuple(label_names)
+        self.series = {}  # 라벨 값 튜플 → [버킷별 개수..., 합계, 전체 개수]
+        self.lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self.lock:
+            series = self.series.setdefault(label_values, [0] * len(self.buckets) + [0.0, 0])
+            for n, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[n] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for label_values, series in sorted(self.series.items()):
+                labels = list(zip(self.label_names, label_values))
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', bound)])} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', '+Inf')])} {series[-1]}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {series[-2]}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {series[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for label_values, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(zip(self.label_names, label_values))} {value}")
+        return lines
+
+
+class Gauge:
+    # 값은 /metrics 를 읽을 때 callback() 으로 구한다. {라벨 값 튜플: 값} 또는 숫자 하나를 돌려준다
+    def __init__(self, name, help_text, callback, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.callback = callback
+        self.label_names = tuple(label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        try:
+            values = self.callback()
+        except Exception as e:
+            print(f"[WARN] 지표 {self.name} 수집 실패 : {e}")
+            return lines
+        if not isinstance(values, dict):
+            values = {(): values}
+        for label_values, value in sorted(values.items()):
+            if value is not None:
+                lines.append(f"{self.name}{_format_labels(zip(self.label_names, label_values))} {value}")
+        return lines
+
+
+# ===== 지표 =====
+STAGES = ('embedding', 'faiss_search', 'tokenization', 'prefill', 'decode', 'total')
+
+stage_seconds = Histogram("chat_stage_seconds", "Latency of each chat pipeline stage",
+                          LATENCY_BUCKETS, ("stage",))
+decode_tokens_per_second = Histogram("chat_decode_tokens_per_second", "Generated tokens per second of decode",
+                                     RATE_BUCKETS)
+prompt_tokens = Histogram("chat_prompt_tokens", "Prompt length in tokens", TOKEN_BUCKETS)
+generated_tokens = Histogram("chat_generated_tokens", "Generated answer length in tokens", TOKEN_BUCKETS)
+queue_wait_seconds = Histogram("chat_queue_wait_seconds", "Time spent waiting for admission", LATENCY_BUCKETS)
+requests_total = Counter("chat_requests_total", "Chat requests by endpoint and outcome", ("endpoint", "outcome"))
+rag_total = Counter("chat_rag_total", "RAG context used (hit) or skipped because nothing was relevant (miss)",
+                    ("result",))
+profiles_total = Counter("chat_profiles_total",
+                         "Profiles saved, or requests that should have been profiled while another profile was running",
+                         ("outcome",))
+
+
+def _queue_depth():
+    from .admission import get_admission_controller
+    controller = get_admission_controller()
+    if controller is None:
+        return None
+    stats = controller.get_stats()
+    return {('active',): stats['active'], ('queued',): stats['queued']}
+
+
+def _model_memory():
+    # 모델 가중치 + (GPU 면) 할당된 메모리, 프로세스 RSS
+    from . import llama_loader
+    values = {}
+    model = llama_loader.model
+    if model is not None:
+        values[('parameters',)] = sum(p.numel() * p.element_size() for p in model.parameters())
+        try:
+            import torch
+            if torch.cuda.is_available():
+                values[('cuda_allocated',)] = torch.cuda.memory_allocated()
+        except ImportError:
+            pass
+    try:
+        import psutil
+        values[('rss',)] = psutil.Process(os.getpid()).memory_info().rss
+    except ImportError:
+        pass
+    return values
+
+
+METRICS = [
+    stage_seconds,
+    decode_tokens_per_second,
+    prompt_tokens,
+    generated_tokens,
+    queue_wait_seconds,
+    requests_total,
+    rag_total,
+    profiles_total,
+    Gauge("chat_queue_depth", "Requests generating (active) and waiting (queued)", _queue_depth, ("state",)),
+    Gauge("chat_model_memory_bytes", "Model and process memory", _model_memory, ("kind",)),
+]
+
+
+def render():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ===== 기록 =====
+def record_profile(outcome):
+    # 'saved' | 'missed_sampled' (표본으로 뽑혔는데 다른 프로파일 중) | 'missed_slow' (다른 프로파일 중에 느린 요청)
+    profiles_total.inc(outcome)
+
+
+def record_rag(rag):
+    # get_rag_context 의 rag['timing'] (embedding, faiss_search) + 문맥 사용 여부
+    # 질문 캐시 적중으로 건너뛴 단계는 timing 에 없으므로 관측하지 않는다
+    rag_total.inc('hit' if rag['doc_ids'] else 'miss')
+    for stage in ('embedding', 'faiss_search'):
+        if stage in rag.get('timing', {}):
+            stage_seconds.observe(rag['timing'][stage], stage)
+
+
+def record_generation(result):
+    # 실제로 생성한 경우만 (답변 캐시 적중 / 다른 요청 결과 공유는 제외)
+    if result.get('cache_hit') or result.get('coalesced'):
+        return
+    for stage, key in (('tokenization', 'preprocess'), ('prefill', 'prefill'), ('decode', 'decode')):
+        if key in result:
+            stage_seconds.observe(result[key], stage)
+    if 'prompt_tokens' in result:
+        prompt_tokens.observe(result['prompt_tokens'])
+    generated_tokens.observe(result['generated_tokens'])
+    decode_time = result.get('decode', result.get('generation'))
+    if decode_time:
+        decode_tokens_per_second.observe(result['generated_tokens'] / decode_time)
+    if 'queue_wait' in result:
+        queue_wait_seconds.observe(result['queue_wait'])
+
+
+def record_request(endpoint, outcome, total=None):
+    requests_total.inc(endpoint, outcome)
+    if total is not None:
+        stage_seconds.observe(total, 'total')
+
+
+def log_request(**fields):
+    # 요청마다 stdout 에 프롬프트를 찍지 않고 CHAT_LOG_SAMPLE_RATE 비율만 JSON 한 줄로 남긴다
+    if random.random() >= getattr(settings, 'CHAT_LOG_SAMPLE_RATE', 0.01):
+        return
+    request_logger.info(json.dumps({'ts': time.time(), **fields}, ensure_ascii=False, default=str))
@@ -0,0 +1,78 @@
+# chat_api/prefix_cache.py
+# 프롬프트 앞부분(Gemma 턴 헤더 + 지시문 + RAG 문맥)의 KV 캐시를 보관했다가
+# 같은 앞부분으로 시작하는 요청은 그 뒤(질문)만 prefill 하도록 한다
+import threading
+from collections import OrderedDict
+
+import torch
+from django.conf import settings
+from transformers import DynamicCache
+
+
+class PrefixCache:
+    def __init__(self, maxsize=32):
+        # (어댑터 이름, 접두어 토큰 id 튜플) → 레이어별 (key, value) 텐서 (legacy 형식)
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'reused_tokens': 0}
+
+    def _encode(self, tokenizer, model, prefix):
+        ids = tokenizer(prefix, return_tensors="pt")["input_ids"]
+        return ids.to(model.device)
+
+    def lookup(self, tokenizer, model, prefix, input_ids, adapter=None):
+        # input_ids(1 x n) 가 prefix 로 시작하면 (past_key_values, 재사용한 토큰 수), 아니면 (None, 0)
+        # 처음 보는 접두어는 여기서 prefill 해서 저장한다. LoRA 어댑터가 다르면 KV 도 다르므로 따로 저장
+        prefix_ids = self._encode(tokenizer, model, prefix)
+        length = prefix_ids.shape[1]
+        # 질문 쪽에 최소 한 토큰은 남아야 하고, 토크나이저가 경계에서 다르게 자르면 재사용하지 않는다
+        if length >= input_ids.shape[1] or not torch.equal(input_ids[0, :length], prefix_ids[0]):
+            return None, 0
+
+        key = (adapter, tuple(prefix_ids[0].tolist()))
+        with self.lock:
+            legacy = self.entries.get(key)
+            if legacy is not None:
+                self.entries.move_to_end(key)
+                self.stats['hits'] += 1
+                self.stats['reused_tokens'] += length
+            else:
+                self.stats['misses'] += 1
+
+        if legacy is None:
+            with torch.no_grad():
+                past = model(input_ids=prefix_ids, use_cache=True).past_key_values
+            legacy = past.to_legacy_cache() if hasattr(past, "to_legacy_cache") else past
+            with self.lock:
+                self.entries[key] = legacy
+                while len(self.entries) > self.maxsize:
+                    self.entries.popitem(last=False)
+
+        # generate 가 캐시 뒤에 토큰을 이어 붙이므로 매번 새 DynamicCache 로 감싼다 (저장된 텐서는 바뀌지 않는다)
+        return DynamicCache.from_legacy_cache(legacy), length
+
+    def clear(self):
+        # 모델(어댑터)이 바뀌면 이전 KV 는 쓸 수 없다
+        with self.lock:
+            self.entries.clear()
+
+    def get_stats(self):
+        with self.lock:
+            return {**self.stats, 'size': len(self.entries), 'maxsize': self.maxsize}
+
+
+_prefix_cache = None
+_prefix_cache_lock = threading.Lock()
+
+
+def get_prefix_cache():
+    # CHAT_PREFIX_CACHE_SIZE 가 0 이면 None
+    global _prefix_cache
+    maxsize = getattr(settings, 'CHAT_PREFIX_CACHE_SIZE', 32)
+    if not maxsize:
+        return None
+    with _prefix_cache_lock:
+        if _prefix_cache is None:
+            _prefix_cache = PrefixCache(maxsize)
+    return _prefix_cache
@@ -0,0 +1,222 @@
+# chat_api/profiling.py
+# 느린 요청의 시간이 어디(RAG 임베딩 / 토크나이즈 / prefill / decode)에 쓰였는지 보기 위한 선택적 프로파일링
+#  - CHAT_PROFILE_SAMPLE_RATE 비율의 요청, 또는 CHAT_PROFILE_SLOW_SECONDS 보다 오래 걸린 요청의 trace 를 저장
+#  - "cprofile" : 요청을 처리한 스레드의 파이썬 호출 (.prof, snakeviz / pstats 로 확인)
+#  - "torch"    : torch.profiler CPU(+CUDA) 연산자 trace (.json, chrome://tracing / perfetto 로 확인)
+#  - 최근 CHAT_PROFILE_KEEP 개만 남기고 오래된 파일은 지운다
+# CHAT_PROFILING_ENABLED 가 꺼져 있으면 설정 하나만 확인하고 바로 넘어간다
+# 프로파일러는 프로세스에 하나만 켤 수 있어서(cProfile 3.12+ / torch.profiler) 동시에 들어온 요청은 기록하지 못한다
+#  - 그렇게 놓친 요청 중 표본이거나 느렸던 것은 chat_profiles_total{outcome="missed_..."} 로 센다
+# cProfile 은 켠 스레드만 기록하므로 생성이 어디서 도는지에 따라 보이는 범위가 다르다
+#  - 요청 하나씩 생성 (chat_test / chat_async) : 요청 스레드에서 생성까지 전부 기록
+#  - chat_stream : generate 워커 스레드도 bind() 로 같은 trace 에 합친다
+#  - CHAT_SCHEDULER 가 batch / continuous : 생성은 스케줄러 스레드에서 돌므로 torch 백엔드로 바꿔서 기록
+#  - 추론 서버 모드 : 생성은 추론 서버 프로세스에서 따로 프로파일링한다 (같은 CHAT_PROFILE_DIR 에 저장)
+import functools
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+
+from . import metrics
+
+TRACE_SUFFIXES = (".prof", ".json")
+TRACE_NAME = re.compile(r"^[\w.-]+$")
+
+_active = threading.Lock()  # 프로파일러는 한 번에 하나만 (cProfile 은 동시에 여러 개 켤 수 없다)
+_local = threading.local()  # 이 스레드에서 켜진 프로파일러 (요청이 띄우는 생성 스레드에 넘겨주기 위해)
+_warned = False
+
+
+def profile_dir():
+    return str(getattr(settings, 'CHAT_PROFILE_DIR', settings.BASE_DIR / "logs" / "profiles"))
+
+
+def _should_start():
+    # (프로파일을 켤지, 표본으로 뽑혔는지). 느린 요청 기준이 있으면 끝나봐야 알 수 있으므로 일단 켠다
+    sampled = random.random() < getattr(settings, 'CHAT_PROFILE_SAMPLE_RATE', 0.0)
+    slow_seconds = getattr(settings, 'CHAT_PROFILE_SLOW_SECONDS', None)
+    return sampled or slow_seconds is not None, sampled
+
+
+def _backend_name():
+    # 생성이 스케줄러 스레드에서 도는 설정이면 cProfile 로는 보이지 않으므로 모든 스레드의 연산자를 남기는 torch 로
+    global _warned
+    backend = getattr(settings, 'CHAT_PROFILE_BACKEND', 'cprofile')
+    if backend == 'cprofile' and getattr(settings, 'CHAT_SCHEDULER', 'none') in ('batch', 'continuous'):
+        if not _warned:
+            _warned = True
+            print("[WARN] 배치 스케줄러 사용 중에는 cProfile 이 생성을 볼 수 없어 torch 백엔드로 프로파일링")
+        return 'torch'
+    return backend
+
+
+class _CProfile:
+    suffix = ".prof"
+
+    def __init__(self):
+        import cProfile
+        self.profiler = cProfile.Profile()
+        self.workers = []  # bind() 된 스레드 중 끝난 것들의 프로파일러
+
+    def start(self):
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+
+    def run_in_worker(self, target, *args, **kwargs):
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return target(*args, **kwargs)
+        finally:
+            profiler.disable()
+            self.workers.append(profiler)
+
+    def save(self, path):
+        import pstats
+        stats = pstats.Stats(self.profiler)
+        for profiler in list(self.workers):
+            try:
+                stats.add(profiler)
+            except TypeError:
+                pass  # 기록된 호출이 없는 경우
+        stats.dump_stats(path)
+
+
+class _TorchProfile:
+    suffix = ".json"
+
+    def __init__(self):
+        import torch
+        from torch.profiler import ProfilerActivity, profile
+        activities = [ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(ProfilerActivity.CUDA)
+        self.profiler = profile(activities=activities, record_shapes=True)
+
+    def start(self):
+        self.profiler.__enter__()
+
+    def stop(self):
+        self.profiler.__exit__(None, None, None)
+
+    def save(self, path):
+        self.profiler.export_chrome_trace(path)
+
+
+BACKENDS = {'cprofile': _CProfile, 'torch': _TorchProfile}
+
+
+@contextmanager
+def maybe_profile(name):
+    # name : trace 파일 이름에 들어갈 요청 종류 (chat_test 등)
+    if not getattr(settings, 'CHAT_PROFILING_ENABLED', False):
+        yield
+        return
+    start_profile, sampled = _should_start()
+    if not start_profile:
+        yield
+        return
+    if not _active.acquire(blocking=False):
+        with _count_missed(sampled):
+            yield
+        return
+
+    try:
+        profiler = BACKENDS[_backend_name()]()
+        profiler.start()
+    except Exception as e:
+        _active.release()
+        print(f"[WARN] 프로파일러 시작 실패 : {e}")
+        yield
+        return
+
+    start = time.time()
+    _local.profiler = profiler
+    try:
+        yield
+    finally:
+        _local.profiler = None
+        profiler.stop()
+        elapsed = time.time() - start
+        try:
+            slow_seconds = getattr(settings, 'CHAT_PROFILE_SLOW_SECONDS', None)
+            if sampled or (slow_seconds is not None and elapsed >= slow_seconds):
+                _save(profiler, name, elapsed)
+                metrics.record_profile('saved')
+        except Exception as e:
+            print(f"[WARN] 프로파일 저장 실패 : {e}")
+        finally:
+            _active.release()
+
+
+@contextmanager
+def _count_missed(sampled):
+    # 다른 요청을 프로파일링하는 중이라 건너뛴 요청. 저장됐어야 할 요청이면 센다
+    start = time.time()
+    try:
+        yield
+    finally:
+        slow_seconds = getattr(settings, 'CHAT_PROFILE_SLOW_SECONDS', None)
+        if sampled:
+            metrics.record_profile('missed_sampled')
+        elif slow_seconds is not None and time.time() - start >= slow_seconds:
+            metrics.record_profile('missed_slow')
+
+
+def bind(target):
+    # 이 스레드에서 cProfile 이 켜져 있으면 target 을 실행하는 새 스레드의 호출도 같은 trace 에 합친다
+    # threading.Thread(target=profiling.bind(fn)) 처럼 스레드를 만들 때 감싼다
+    profiler = getattr(_local, 'profiler', None)
+    if profiler is None or not hasattr(profiler, 'run_in_worker'):
+        return target
+    return functools.partial(profiler.run_in_worker, target)
+
+
+def _save(profiler, name, elapsed):
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    filename = f"{time.strftime('%Y%m%d-%H%M%S')}-{name}-{int(elapsed * 1000)}ms-{uuid.uuid4().hex[:8]}{profiler.suffix}"
+    tmp_path = os.path.join(directory, filename + ".tmp")
+    profiler.save(tmp_path)
+    os.replace(tmp_path, os.path.join(directory, filename))
+    _rotate(directory, getattr(settings, 'CHAT_PROFILE_KEEP', 50))
+
+
+def _rotate(directory, keep):
+    traces = list_traces()
+    for trace in traces[keep:]:
+        try:
+            os.remove(os.path.join(directory, trace['name']))
+        except OSError:
+            pass
+
+
+def list_traces():
+    # 최신순 [{'name', 'size', 'created_at'}]
+    directory = profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    traces = []
+    for name in os.listdir(directory):
+        if not name.endswith(TRACE_SUFFIXES):
+            continue
+        stat = os.stat(os.path.join(directory, name))
+        traces.append({'name': name, 'size': stat.st_size, 'created_at': stat.st_mtime})
+    return sorted(traces, key=lambda trace: trace['created_at'], reverse=True)
+
+
+def trace_path(name):
+    # 디렉토리 밖 경로를 받지 않도록 파일 이름만 허용. 없으면 None
+    if not TRACE_NAME.match(name) or not name.endswith(TRACE_SUFFIXES):
+        return None
+    path = os.path.join(profile_dir(), name)
+    return path if os.path.isfile(path) else None
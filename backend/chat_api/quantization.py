@@ -0,0 +1,49 @@
+# chat_api/quantization.py
+# GPU 가 없는 추론 서버용 CPU 설정 : 스레드 수 + 가중치 양자화
+#  - int8 : torch 동적 양자화 (nn.Linear 가중치 int8, 활성값은 실행 시 양자화). float32 모델에 적용
+#  - int4 : torchao weight-only int4 (bfloat16 모델에 적용, torchao 설치 필요)
+import os
+
+import torch
+
+QUANTIZATION_MODES = ("none", "int8", "int4")
+
+# 양자화 방식별로 불러올 때 쓰는 dtype. CPU 는 float16 행렬곱이 느리거나 지원되지 않는다
+QUANTIZATION_DTYPES = {
+    "int8": torch.float32,
+    "int4": torch.bfloat16,
+}
+
+DTYPES = {
+    "float16": torch.float16,
+    "bfloat16": torch.bfloat16,
+    "float32": torch.float32,
+}
+
+
+def configure_cpu_threads(num_threads=None):
+    # num_threads 가 없으면 물리 코어 수로 추정 (하이퍼스레딩 코어까지 쓰면 행렬곱이 오히려 느려진다)
+    num_threads = num_threads or max((os.cpu_count() or 2) // 2, 1)
+    torch.set_num_threads(num_threads)
+    try:
+        torch.set_num_interop_threads(1)  # 요청 하나 안의 연산자 간 병렬화는 이득이 없다
+    except RuntimeError:
+        pass  # 이미 병렬 작업이 시작된 뒤에는 바꿀 수 없다
+    return num_threads
+
+
+def quantize_model(model, mode):
+    # LoRA 가 병합된 모델에 적용해야 한다 (PeftModel 의 lora_A / lora_B 까지 양자화되지 않도록)
+    if mode == "none":
+        return model
+    if mode == "int8":
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if mode == "int4":
+        try:
+            from torchao.dtypes import Int4CPULayout
+            from torchao.quantization import Int4WeightOnlyConfig, quantize_
+        except ImportError as e:
+            raise ImportError("int4 양자화에는 torchao 가 필요합니다 (pip install torchao)") from e
+        quantize_(model, Int4WeightOnlyConfig(group_size=128, layout=Int4CPULayout()))
+        return model
+    raise ValueError(f"알 수 없는 양자화 방식 : {mode} (가능한 값 : {', '.join(QUANTIZATION_MODES)})")
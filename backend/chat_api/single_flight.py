@@ -0,0 +1,152 @@
+# chat_api/single_flight.py
+# 같은 질문 + 같은 생성 설정의 요청이 동시에 여러 개 들어오면 첫 요청만 RAG 검색과 생성을 하고
+# 나머지는 그 결과(스트리밍이면 같은 토큰 스트림)를 나눠 받는다
+import threading
+from concurrent.futures import Future
+
+from django.conf import settings
+
+
+def flight_key(question, **params):
+    # params : 답변을 바꾸는 요청별 설정 (top_k, 응답 형태 등)
+    # query_rag 는 import 할 때 임베딩 모델을 올리므로 필요할 때 가져온다
+    from tools.query_rag import normalize_question
+    return normalize_question(question), tuple(sorted(params.items()))
+
+
+_CANCELLED = object()  # 선두 요청의 생성이 취소돼 공유하지 않는 결과
+
+
+class _GroupCancel:
+    # 참여한 요청이 모두 취소됐을 때만 set 으로 보이는 cancel_event (생성 쪽은 is_set() 만 쓴다)
+    # 한 번 set 으로 보이면 생성이 이미 멈췄을 수 있으므로 그 뒤로는 계속 set (새 요청은 이 그룹에 합류하지 않는다)
+    def __init__(self):
+        self.events = []
+        self.cancelled = False
+
+    def add(self, event):
+        self.events.append(event)
+
+    def is_set(self):
+        if not self.cancelled:
+            self.cancelled = bool(self.events) and all(e is not None and e.is_set() for e in self.events)
+        return self.cancelled
+
+
+class _SharedStream:
+    # 원본 제너레이터는 별도 스레드가 끝까지 소비하고, 구독자는 처음부터 버퍼를 따라 읽는다
+    # (먼저 온 요청의 클라이언트가 끊겨도 나머지 요청의 스트림은 계속된다)
+    def __init__(self):
+        self.events = []
+        self.finished = False
+        self.error = None
+        self.cond = threading.Condition()
+
+    def run(self, source, on_finish):
+        try:
+            for item in source:
+                with self.cond:
+                    self.events.append(item)
+                    self.cond.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            on_finish()
+            with self.cond:
+                self.finished = True
+                self.cond.notify_all()
+
+    def subscribe(self):
+        n = 0
+        while True:
+            with self.cond:
+                while n >= len(self.events) and not self.finished:
+                    self.cond.wait()
+                if n < len(self.events):
+                    item = self.events[n]
+                elif self.error is not None:
+                    raise self.error
+                else:
+                    return
+            n += 1
+            yield item
+
+
+class SingleFlight:
+    def __init__(self):
+        self.calls = {}     # key → (Future, _GroupCancel)
+        self.streams = {}   # key → _SharedStream
+        self.lock = threading.Lock()
+        self.stats = {'leaders': 0, 'followers': 0, 'retried': 0, 'stream_leaders': 0, 'stream_followers': 0}
+
+    def do(self, key, fn, cancel_event=None):
+        # fn(cancel_event) 를 key 당 한 번만 실행. (결과, 다른 요청의 결과를 받았는지) 반환
+        # 취소돼 잘린 결과는 기다리던 요청에 넘기지 않고, 그 요청이 다시 (보통은 선두로) 실행한다
+        while True:
+            with self.lock:
+                call = self.calls.get(key)
+                leader = call is None or call[1].cancelled
+                if leader:
+                    call = (Future(), _GroupCancel())
+                    self.calls[key] = call
+                call[1].add(cancel_event)
+                self.stats['leaders' if leader else 'followers'] += 1
+
+            future, group_cancel = call
+            if leader:
+                break
+            result = future.result()
+            if result is not _CANCELLED:
+                return result, True
+            with self.lock:
+                self.stats['retried'] += 1
+
+        try:
+            result = fn(group_cancel)
+            future.set_result(_CANCELLED if group_cancel.cancelled else result)
+            return result, False
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                # 취소된 그룹이면 이미 새 선두로 바뀌었을 수 있다
+                if self.calls.get(key) is call:
+                    del self.calls[key]
+
+    def stream(self, key, source_fn):
+        # source_fn() 이 돌려주는 (event, data) 스트림을 key 당 하나만 만든다. (이벤트 제너레이터, 공유 여부) 반환
+        with self.lock:
+            shared = self.streams.get(key)
+            leader = shared is None
+            if leader:
+                shared = _SharedStream()
+                self.streams[key] = shared
+            self.stats['stream_leaders' if leader else 'stream_followers'] += 1
+
+        if leader:
+            def finish():
+                with self.lock:
+                    self.streams.pop(key, None)
+            threading.Thread(target=shared.run, args=(source_fn(), finish), name="single-flight-stream",
+                             daemon=True).start()
+        return shared.subscribe(), not leader
+
+    def get_stats(self):
+        with self.lock:
+            return {**self.stats, 'in_flight': len(self.calls) + len(self.streams)}
+
+
+_single_flight = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight():
+    # CHAT_SINGLE_FLIGHT 가 꺼져 있으면 None
+    global _single_flight
+    if not getattr(settings, 'CHAT_SINGLE_FLIGHT', True):
+        return None
+    with _single_flight_lock:
+        if _single_flight is None:
+            _single_flight = SingleFlight()
+    return _single_flight
@@ -0,0 +1,82 @@
+# chat_api/speculative.py
+# 추측(assisted) 디코딩 : 초안이 여러 토큰을 제안하고 파인튜닝된 Gemma 가 한 번의 forward 로 검증한다
+#  - "prompt_lookup" : 프롬프트(RAG 문맥)에서 마지막 n-gram 과 이어지는 토큰을 그대로 복사해서 제안 (추가 모델 없음)
+#  - "draft"         : CHAT_DRAFT_MODEL (같은 토크나이저를 쓰는 작은 모델) 이 제안
+# 요청 하나씩 생성할 때만 적용된다 (transformers 의 assisted generation 은 배치 1 만 지원)
+import threading
+
+from django.conf import settings
+from transformers import AutoModelForCausalLM
+
+SPECULATIVE_MODES = ("none", "prompt_lookup", "draft")
+
+_draft_model = None
+_draft_lock = threading.Lock()
+_local = threading.local()  # 생성 중인 스레드의 AcceptanceCounter
+_hooked = set()
+
+
+def get_mode():
+    return getattr(settings, 'CHAT_SPECULATIVE', 'none')
+
+
+def _get_draft_model(model):
+    global _draft_model
+    with _draft_lock:
+        if _draft_model is None:
+            name = getattr(settings, 'CHAT_DRAFT_MODEL', None)
+            if not name:
+                raise ValueError("CHAT_SPECULATIVE='draft' 에는 CHAT_DRAFT_MODEL 설정이 필요합니다")
+            print(f"[INFO] 초안 모델 로딩 : {name}")
+            _draft_model = AutoModelForCausalLM.from_pretrained(name, local_files_only=True,
+                                                                torch_dtype=model.dtype).to(model.device)
+    return _draft_model
+
+
+def generate_kwargs(model, batch_size):
+    # model.generate 에 추가로 넘길 인자. 꺼져 있거나 배치면 빈 dict
+    mode = get_mode()
+    if mode == 'none' or batch_size != 1:
+        return {}
+    if mode == 'prompt_lookup':
+        return {'prompt_lookup_num_tokens': getattr(settings, 'CHAT_PROMPT_LOOKUP_TOKENS', 10)}
+    if mode == 'draft':
+        return {'assistant_model': _get_draft_model(model)}
+    raise ValueError(f"알 수 없는 추측 디코딩 방식 : {mode} (가능한 값 : {', '.join(SPECULATIVE_MODES)})")
+
+
+def _count_forward(module, args, kwargs):
+    counter = getattr(_local, 'counter', None)
+    if counter is None:
+        return
+    input_ids = kwargs.get('input_ids', args[0] if args else None)
+    if input_ids is not None:
+        counter.forwards.append(input_ids.shape[1])
+
+
+class AcceptanceCounter:
+    # 본 모델의 forward 입력 길이를 기록해서 초안 토큰 채택률을 계산한다
+    # 첫 forward 는 prefill, 이후 forward 마다 입력 = 마지막 토큰 1개 + 제안 k 개, 출력 = 채택된 토큰 + 1개
+    def __init__(self, model):
+        inner = model.get_base_model() if hasattr(model, "get_base_model") else model  # PeftModel 이면 안쪽 모델
+        if id(inner) not in _hooked:
+            inner.register_forward_pre_hook(_count_forward, with_kwargs=True)
+            _hooked.add(id(inner))
+        self.forwards = []
+
+    def __enter__(self):
+        _local.counter = self
+        return self
+
+    def __exit__(self, *exc):
+        _local.counter = None
+
+    def stats(self, generated_tokens):
+        steps = self.forwards[1:]
+        proposed = sum(length - 1 for length in steps)
+        accepted = max(generated_tokens - 1 - len(steps), 0)
+        return {
+            'draft_proposed': proposed,
+            'draft_accepted': accepted,
+            'acceptance_rate': accepted / proposed if proposed else 0.0,
+        }
@@ -0,0 +1,94 @@
+# chat_api/stopping.py
+# 답변 정책(첫 줄만 사용 등)에 필요 없는 토큰은 아예 생성하지 않도록 하는 중단 조건
+import time
+
+import torch
+from django.conf import settings
+from transformers import StoppingCriteria
+
+END_OF_TURN = "<end_of_turn>"
+
+
+def trim_stop_strings(text, stop_strings):
+    # 중단 문자열 이후는 답변에서 제외
+    for s in stop_strings:
+        cut = text.find(s) if s else -1
+        if cut != -1:
+            text = text[:cut]
+    return text
+
+
+class StopPolicy:
+    def __init__(self, tokenizer, stop_at_newline=True, stop_strings=(), stop_at_end_of_turn=True):
+        self.tokenizer = tokenizer
+        self.stop_at_newline = stop_at_newline
+        self.stop_strings = [s for s in stop_strings if s]
+        self.stop_token_ids = {tokenizer.eos_token_id: 'eos'}
+        if stop_at_end_of_turn:
+            token_id = tokenizer.convert_tokens_to_ids(END_OF_TURN)
+            if token_id is not None and token_id != tokenizer.unk_token_id:
+                self.stop_token_ids[token_id] = 'end_of_turn'
+
+    @classmethod
+    def from_settings(cls, tokenizer):
+        return cls(
+            tokenizer,
+            stop_at_newline=getattr(settings, 'CHAT_STOP_AT_NEWLINE', True),
+            stop_strings=getattr(settings, 'CHAT_STOP_STRINGS', ()),
+            stop_at_end_of_turn=getattr(settings, 'CHAT_STOP_AT_END_OF_TURN', True),
+        )
+
+    def reason(self, token_ids):
+        # 생성된 토큰 기준으로 멈춰야 하면 이유('eos', 'end_of_turn', 'newline', 'stop_string'), 아니면 None
+        if not token_ids:
+            return None
+        if token_ids[-1] in self.stop_token_ids:
+            return self.stop_token_ids[token_ids[-1]]
+        if not (self.stop_at_newline or self.stop_strings):
+            return None
+
+        text = self.tokenizer.decode(token_ids, skip_special_tokens=True)
+        if self.stop_at_newline and "\n" in text.lstrip():
+            return 'newline'
+        if any(s in text for s in self.stop_strings):
+            return 'stop_string'
+        return None
+
+    def trim(self, text):
+        return trim_stop_strings(text, self.stop_strings)
+
+
+class PolicyStoppingCriteria(StoppingCriteria):
+    # model.generate 용 래퍼. 행별로 처음 멈춘 이유와 그 시점의 생성 토큰 수를 기록한다
+    # cancel_event 가 set 되면 아직 안 끝난 행은 모두 'cancelled' 로 멈춘다
+    def __init__(self, policy, prompt_length, cancel_event=None):
+        self.policy = policy
+        self.prompt_length = prompt_length
+        self.cancel_event = cancel_event
+        self.reasons = {}
+        self.lengths = {}
+        self.first_token_at = None  # 첫 토큰이 나온 시각 (prefill / decode 구간 구분용)
+
+    def __call__(self, input_ids, scores, **kwargs):
+        if self.first_token_at is None:
+            self.first_token_at = time.time()
+        done = torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+        cancelled = self.cancel_event is not None and self.cancel_event.is_set()
+        for row in range(input_ids.shape[0]):
+            if row not in self.reasons:
+                token_ids = input_ids[row, self.prompt_length:].tolist()
+                # 추측 디코딩은 한 스텝에 여러 토큰이 붙으므로 중간에 나온 종료 토큰까지만 본다
+                stop_at = next((i for i, t in enumerate(token_ids) if t in self.policy.stop_token_ids), None)
+                if stop_at is not None:
+                    token_ids = token_ids[:stop_at + 1]
+                reason = 'cancelled' if cancelled else self.policy.reason(token_ids)
+                if reason is None:
+                    continue
+                self.reasons[row] = reason
+                self.lengths[row] = len(token_ids)
+            done[row] = True
+        return done
+
+    def result(self, row, generated_length):
+        # (stop_reason, generated_tokens). 끝까지 멈추지 않았으면 max_new_tokens 에 걸린 것
+        return self.reasons.get(row, 'max_tokens'), self.lengths.get(row, generated_length)
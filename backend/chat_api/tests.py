@@ -1,3 +1,526 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+import time
 
-# Create your tests here.
+import numpy as np
+import torch
+from django.test import SimpleTestCase
+
+from tools.bm25_index import BM25Index, build_bm25, fuse_rankings
+from tools.doc_store import DocStore
+from tools.embed_documents import split_passages
+from tools.rag_prompt import CONTEXT_INSTRUCTION, CONTEXT_SUFFIX, PROMPT_FOOTER, PROMPT_HEADER, build_prompt
+
+from .admission import AdmissionController, DeadlineExceeded, QueueFull
+from .answer_cache import SemanticAnswerCache
+from .single_flight import SingleFlight, _GroupCancel
+from .stopping import PolicyStoppingCriteria, StopPolicy
+
+TIMEOUT = 5  # 스레드가 엉키면 테스트가 멈추지 않고 실패하도록
+
+
+def _wait_until(condition, timeout=TIMEOUT):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError("조건을 기다리다 시간 초과")
+        time.sleep(0.005)
+
+
+def _start(target, *args):
+    thread = threading.Thread(target=target, args=args, daemon=True)
+    thread.start()
+    return thread
+
+
+class AdmissionControllerTests(SimpleTestCase):
+    def test_admits_immediately_when_idle(self):
+        controller = AdmissionController(max_active=1, max_queue=1, deadline=1.0)
+        self.assertEqual(controller.acquire(), (0.0, 0))
+        self.assertEqual(controller.get_stats()['active'], 1)
+
+    def test_rejects_when_queue_is_full(self):
+        controller = AdmissionController(max_active=1, max_queue=1, deadline=TIMEOUT)
+        controller.acquire()
+        waiter = _start(controller.acquire)
+        _wait_until(lambda: controller.get_stats()['queued'] == 1)
+
+        with self.assertRaises(QueueFull) as raised:
+            controller.acquire()
+        self.assertGreaterEqual(raised.exception.retry_after, 1)
+        with self.assertRaises(QueueFull):
+            controller.check()
+        self.assertEqual(controller.get_stats()['rejected'], 2)
+
+        controller.release(0.1)
+        waiter.join(TIMEOUT)
+        self.assertEqual(controller.get_stats()['queued'], 0)
+
+    def test_deadline_expires_and_leaves_queue(self):
+        controller = AdmissionController(max_active=1, max_queue=4, deadline=0.05)
+        controller.acquire()
+        with self.assertRaises(DeadlineExceeded):
+            controller.acquire()
+        stats = controller.get_stats()
+        self.assertEqual((stats['expired'], stats['queued'], stats['active']), (1, 0, 1))
+
+    def test_cancelled_waiter_leaves_queue(self):
+        controller = AdmissionController(max_active=1, max_queue=4, deadline=TIMEOUT)
+        controller.acquire()
+        cancel_event = threading.Event()
+        errors = []
+
+        def wait():
+            try:
+                controller.acquire(cancel_event)
+            except DeadlineExceeded as e:
+                errors.append(e)
+
+        waiter = _start(wait)
+        _wait_until(lambda: controller.get_stats()['queued'] == 1)
+        cancel_event.set()
+        waiter.join(TIMEOUT)
+
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(controller.get_stats()['cancelled'], 1)
+        self.assertEqual(controller.get_stats()['queued'], 0)
+
+    def test_waiters_are_admitted_in_arrival_order(self):
+        controller = AdmissionController(max_active=1, max_queue=4, deadline=TIMEOUT)
+        controller.acquire()
+        order = []
+
+        def wait(name):
+            controller.acquire()
+            order.append(name)
+            controller.release(0.0)
+
+        threads = []
+        for n, name in enumerate(('first', 'second', 'third')):
+            threads.append(_start(wait, name))
+            _wait_until(lambda: controller.get_stats()['queued'] == n + 1)
+
+        controller.release(0.0)
+        for thread in threads:
+            thread.join(TIMEOUT)
+        self.assertEqual(order, ['first', 'second', 'third'])
+
+    def test_admit_releases_on_error(self):
+        controller = AdmissionController(max_active=1, max_queue=1, deadline=1.0)
+        with self.assertRaises(RuntimeError):
+            with controller.admit() as queue:
+                self.assertEqual(queue, {'queue_wait': 0.0, 'queue_depth': 0})
+                raise RuntimeError("생성 실패")
+        self.assertEqual(controller.get_stats()['active'], 0)
+        self.assertIsNotNone(controller.service_time)
+
+
+class GroupCancelTests(SimpleTestCase):
+    def test_set_only_when_every_waiter_cancelled(self):
+        first, second = threading.Event(), threading.Event()
+        group = _GroupCancel()
+        group.add(first)
+        group.add(second)
+
+        first.set()
+        self.assertFalse(group.is_set())
+        second.set()
+        self.assertTrue(group.is_set())
+
+    def test_waiter_without_event_never_cancels(self):
+        cancelled = threading.Event()
+        cancelled.set()
+        group = _GroupCancel()
+        group.add(cancelled)
+        group.add(None)
+        self.assertFalse(group.is_set())
+
+    def test_stays_set_after_new_waiter(self):
+        cancelled = threading.Event()
+        cancelled.set()
+        group = _GroupCancel()
+        group.add(cancelled)
+        self.assertTrue(group.is_set())
+        group.add(None)
+        self.assertTrue(group.is_set())
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        gate = threading.Event()
+        calls = []
+        results = []
+
+        def fn(cancel_event):
+            calls.append(1)
+            gate.wait(TIMEOUT)
+            return 'answer'
+
+        leader = _start(lambda: results.append(flight.do('key', fn)))
+        _wait_until(lambda: calls)
+        follower = _start(lambda: results.append(flight.do('key', fn)))
+        _wait_until(lambda: flight.get_stats()['followers'] == 1)
+        gate.set()
+        leader.join(TIMEOUT)
+        follower.join(TIMEOUT)
+
+        self.assertEqual(len(calls), 1)
+        self.assertCountEqual(results, [('answer', False), ('answer', True)])
+        self.assertEqual(flight.get_stats()['in_flight'], 0)
+
+    def test_error_reaches_followers(self):
+        flight = SingleFlight()
+        gate = threading.Event()
+        errors = []
+
+        def fn(cancel_event):
+            gate.wait(TIMEOUT)
+            raise ValueError("실패")
+
+        def call():
+            try:
+                flight.do('key', fn)
+            except ValueError as e:
+                errors.append(e)
+
+        leader = _start(call)
+        _wait_until(lambda: flight.get_stats()['leaders'] == 1)
+        follower = _start(call)
+        _wait_until(lambda: flight.get_stats()['followers'] == 1)
+        gate.set()
+        leader.join(TIMEOUT)
+        follower.join(TIMEOUT)
+        self.assertEqual(len(errors), 2)
+
+    def test_new_request_does_not_join_cancelled_flight(self):
+        flight = SingleFlight()
+        cancelled = threading.Event()
+        cancelled.set()
+        stopped = threading.Event()
+        gate = threading.Event()
+        results = []
+
+        def cancelled_fn(cancel_event):
+            self.assertTrue(cancel_event.is_set())
+            stopped.set()
+            gate.wait(TIMEOUT)
+            return 'truncated'
+
+        leader = _start(lambda: flight.do('key', cancelled_fn, cancelled))
+        stopped.wait(TIMEOUT)
+        results.append(flight.do('key', lambda cancel_event: 'fresh'))
+        gate.set()
+        leader.join(TIMEOUT)
+
+        self.assertEqual(results, [('fresh', False)])
+        self.assertEqual(flight.get_stats()['leaders'], 2)
+
+    def test_follower_reruns_when_leader_result_was_cancelled(self):
+        flight = SingleFlight()
+        leader_cancel, follower_cancel = threading.Event(), threading.Event()
+        gate = threading.Event()
+        results = []
+
+        def leader_fn(cancel_event):
+            gate.wait(TIMEOUT)
+            return 'truncated' if cancel_event.is_set() else 'complete'
+
+        leader = _start(lambda: flight.do('key', leader_fn, leader_cancel))
+        _wait_until(lambda: flight.get_stats()['leaders'] == 1)
+        follower = _start(lambda: results.append(flight.do('key', lambda cancel_event: 'fresh', follower_cancel)))
+        _wait_until(lambda: flight.get_stats()['followers'] == 1)
+
+        # 둘 다 취소된 상태에서 생성이 끝나면 잘린 결과는 공유하지 않는다
+        leader_cancel.set()
+        follower_cancel.set()
+        gate.set()
+        leader.join(TIMEOUT)
+        follower.join(TIMEOUT)
+
+        self.assertEqual(results, [('fresh', False)])
+        self.assertEqual(flight.get_stats()['retried'], 1)
+
+    def test_late_stream_subscriber_replays_from_start(self):
+        flight = SingleFlight()
+        produced = threading.Event()
+        gate = threading.Event()
+
+        def source():
+            yield 'token', 'a'
+            produced.set()
+            gate.wait(TIMEOUT)
+            yield 'token', 'b'
+            yield 'done', {'text': 'ab'}
+
+        first, shared_first = flight.stream('key', source)
+        produced.wait(TIMEOUT)
+        second, shared_second = flight.stream('key', source)
+        gate.set()
+
+        expected = [('token', 'a'), ('token', 'b'), ('done', {'text': 'ab'})]
+        self.assertEqual(list(first), expected)
+        self.assertEqual(list(second), expected)
+        self.assertEqual((shared_first, shared_second), (False, True))
+
+    def test_stream_error_reaches_subscribers(self):
+        flight = SingleFlight()
+
+        def source():
+            yield 'token', 'a'
+            raise RuntimeError("생성 실패")
+
+        events, _ = flight.stream('key', source)
+        self.assertEqual(next(events), ('token', 'a'))
+        with self.assertRaises(RuntimeError):
+            next(events)
+
+
+class _CharTokenizer:
+    # 토큰 id 하나가 글자 하나인 테스트용 토크나이저. 0 = eos, 1 = <end_of_turn>, 2 = unk
+    eos_token_id = 0
+    unk_token_id = 2
+    special = {0: '<eos>', 1: '<end_of_turn>', 2: '<unk>'}
+
+    def convert_tokens_to_ids(self, token):
+        return 1 if token == '<end_of_turn>' else self.unk_token_id
+
+    def encode(self, text):
+        return [ord(c) for c in text]
+
+    def decode(self, token_ids, skip_special_tokens=False):
+        return ''.join('' if t in self.special and skip_special_tokens else self.special.get(t, chr(t))
+                       for t in token_ids)
+
+
+class StopPolicyTests(SimpleTestCase):
+    def setUp(self):
+        self.tokenizer = _CharTokenizer()
+
+    def test_special_tokens(self):
+        policy = StopPolicy(self.tokenizer)
+        self.assertEqual(policy.reason(self.tokenizer.encode("답") + [0]), 'eos')
+        self.assertEqual(policy.reason(self.tokenizer.encode("답") + [1]), 'end_of_turn')
+        self.assertIsNone(policy.reason([]))
+
+    def test_end_of_turn_can_be_disabled(self):
+        policy = StopPolicy(self.tokenizer, stop_at_newline=False, stop_at_end_of_turn=False)
+        self.assertIsNone(policy.reason(self.tokenizer.encode("답") + [1]))
+
+    def test_newline_after_answer_text(self):
+        policy = StopPolicy(self.tokenizer)
+        # 답변 앞의 줄바꿈은 무시한다
+        self.assertIsNone(policy.reason(self.tokenizer.encode("\n답변")))
+        self.assertEqual(policy.reason(self.tokenizer.encode("\n답변\n")), 'newline')
+        self.assertIsNone(StopPolicy(self.tokenizer, stop_at_newline=False).reason(self.tokenizer.encode("답변\n")))
+
+    def test_stop_string_and_trim(self):
+        policy = StopPolicy(self.tokenizer, stop_at_newline=False, stop_strings=("질문:", ""))
+        self.assertIsNone(policy.reason(self.tokenizer.encode("답변 질")))
+        self.assertEqual(policy.reason(self.tokenizer.encode("답변 질문:")), 'stop_string')
+        self.assertEqual(policy.trim("답변 질문: 다음"), "답변 ")
+        self.assertEqual(policy.trim("답변"), "답변")
+
+
+class PolicyStoppingCriteriaTests(SimpleTestCase):
+    def setUp(self):
+        self.tokenizer = _CharTokenizer()
+        self.prompt = self.tokenizer.encode("프롬프트")
+
+    def _ids(self, *rows):
+        return torch.tensor([self.prompt + self.tokenizer.encode(row) for row in rows])
+
+    def test_rows_stop_independently(self):
+        criteria = PolicyStoppingCriteria(StopPolicy(self.tokenizer), len(self.prompt))
+        done = criteria(self._ids("가\n", "나다"), None)
+        self.assertEqual(done.tolist(), [True, False])
+        self.assertIsNotNone(criteria.first_token_at)
+
+        # 이미 멈춘 행은 이후 토큰이 붙어도 처음 멈춘 이유와 길이를 유지한다
+        done = criteria(self._ids("가\n라", "나다\n"), None)
+        self.assertEqual(done.tolist(), [True, True])
+        self.assertEqual(criteria.result(0, 3), ('newline', 2))
+        self.assertEqual(criteria.result(1, 3), ('newline', 3))
+
+    def test_max_tokens_when_never_stopped(self):
+        criteria = PolicyStoppingCriteria(StopPolicy(self.tokenizer), len(self.prompt))
+        self.assertEqual(criteria(self._ids("가나"), None).tolist(), [False])
+        self.assertEqual(criteria.result(0, 2), ('max_tokens', 2))
+
+    def test_cuts_at_stop_token_inside_step(self):
+        # 추측 디코딩처럼 한 스텝에 여러 토큰이 붙으면 종료 토큰까지만 센다
+        criteria = PolicyStoppingCriteria(StopPolicy(self.tokenizer), len(self.prompt))
+        ids = torch.tensor([self.prompt + self.tokenizer.encode("가") + [0] + self.tokenizer.encode("나다")])
+        self.assertEqual(criteria(ids, None).tolist(), [True])
+        self.assertEqual(criteria.result(0, 4), ('eos', 2))
+
+    def test_cancel_stops_unfinished_rows(self):
+        cancel_event = threading.Event()
+        criteria = PolicyStoppingCriteria(StopPolicy(self.tokenizer), len(self.prompt), cancel_event)
+        self.assertEqual(criteria(self._ids("가\n", "나다"), None).tolist(), [True, False])
+        cancel_event.set()
+        self.assertEqual(criteria(self._ids("가\n라", "나다라"), None).tolist(), [True, True])
+        self.assertEqual(criteria.result(0, 3), ('newline', 2))
+        self.assertEqual(criteria.result(1, 3), ('cancelled', 3))
+
+
+class BM25IndexTests(SimpleTestCase):
+    passages = [
+        (10, "고객센터 전화번호는 02-123-4567 입니다"),
+        (11, "이메일 문의는 help@example.com 으로 보내주세요"),
+        (12, "본사 주소는 서울특별시 중구 세종대로 110"),
+        (13, "전화 상담 시간은 평일 오전 9시부터 오후 6시까지"),
+    ]
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "index.bm25.npz")
+        self.assertEqual(build_bm25(self.passages, self.path)[0], len(self.passages))
+        self.index = BM25Index(self.path)
+
+    def test_exact_token_ranks_first(self):
+        scores, ids = self.index.search("02-123-4567 번호", top_k=3)
+        self.assertEqual(ids[0], 10)
+        self.assertEqual(list(scores), sorted(scores, reverse=True))
+        self.assertTrue((scores > 0).all())
+
+    def test_returns_passage_ids(self):
+        _, ids = self.index.search("전화", top_k=4)
+        self.assertCountEqual(ids.tolist(), [10, 13])
+
+    def test_no_overlap_returns_empty(self):
+        scores, ids = self.index.search("환불 규정", top_k=3)
+        self.assertEqual((len(scores), len(ids)), (0, 0))
+
+
+class FuseRankingsTests(SimpleTestCase):
+    def test_dense_only_keeps_faiss_order(self):
+        self.assertEqual(fuse_rankings([[7, 3, 5]], top_k=3), (7, 3, 5))
+        self.assertEqual(fuse_rankings([[7, 3, 5], []], top_k=2), (7, 3))
+
+    def test_documents_in_both_rankings_move_up(self):
+        # 3 은 두 목록 모두 2위라 한쪽 1위인 7, 9 보다 점수가 높다
+        self.assertEqual(fuse_rankings([[7, 3, 5], [9, 3]], top_k=4), (3, 7, 9, 5))
+
+    def test_top_k_limits_result(self):
+        self.assertEqual(len(fuse_rankings([[1, 2, 3], [4, 5, 6]], top_k=2)), 2)
+
+
+class BuildPromptTests(SimpleTestCase):
+    question = "고객센터 운영 시간은 언제인가요?"
+    passages = [
+        (1, "고객센터는 평일 9시부터 6시까지 운영합니다."),
+        (2, "주말과 공휴일에는 운영하지 않으며 긴급 문의는 이메일로 받습니다. " * 3),
+        (3, "점심시간은 12시부터 1시까지입니다."),
+    ]
+
+    def _fixed(self):
+        # 글자 수를 토큰 수로 센다
+        return len(PROMPT_HEADER + self.question + PROMPT_FOOTER) + len(CONTEXT_INSTRUCTION + "\n\n" + CONTEXT_SUFFIX)
+
+    def test_without_budget_uses_every_passage(self):
+        prompt, prefix, doc_ids = build_prompt(self.question, self.passages)
+        self.assertEqual(doc_ids, (1, 2, 3))
+        self.assertTrue(prompt.startswith(prefix))
+        self.assertTrue(prompt.endswith(self.question + CONTEXT_SUFFIX + PROMPT_FOOTER))
+
+    def test_budget_skips_passages_that_do_not_fit(self):
+        budget = self._fixed() + len(self.passages[0][1] + "\n") + len(self.passages[2][1] + "\n")
+        prompt, _, doc_ids = build_prompt(self.question, self.passages, len, budget)
+        # 긴 2번은 빠지고 그 뒤의 짧은 3번은 들어간다
+        self.assertEqual(doc_ids, (1, 3))
+        self.assertLessEqual(len(prompt), budget)
+        self.assertIn(self.question, prompt)
+
+    def test_question_is_kept_when_no_passage_fits(self):
+        budget = self._fixed() + 5
+        prompt, prefix, doc_ids = build_prompt(self.question, self.passages, len, budget)
+        self.assertEqual(doc_ids, ())
+        self.assertIsNone(prefix)
+        self.assertEqual(prompt, PROMPT_HEADER + self.question + PROMPT_FOOTER)
+
+    def test_same_context_shares_prefix(self):
+        _, first, _ = build_prompt(self.question, self.passages[:1])
+        _, second, _ = build_prompt("다른 질문", self.passages[:1])
+        self.assertEqual(first, second)
+
+
+class SplitPassagesTests(SimpleTestCase):
+    def test_short_text_is_one_passage(self):
+        self.assertEqual(split_passages("짧은 문서", max_chars=10), [(0, 5)])
+        self.assertEqual(split_passages("", max_chars=10), [(0, 0)])
+
+    def test_passages_overlap_and_cover_text(self):
+        spans = split_passages("가" * 25, max_chars=10, overlap=3)
+        self.assertEqual(spans, [(0, 10), (7, 17), (14, 24), (21, 25)])
+
+    def test_last_passage_ends_at_text_end(self):
+        # 마지막 조각이 끝에 닿으면 겹침만 남는 조각은 더 만들지 않는다
+        self.assertEqual(split_passages("가" * 17, max_chars=10, overlap=3), [(0, 10), (7, 17)])
+
+
+class DocStoreTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.path = os.path.join(self.dir, "docs.jsonl")
+        self._write(self.path, [{"text": "첫 번째 문서입니다"}, {"text": "두 번째 문서입니다"}, {"text": "세 번째"}])
+        self.store = DocStore(self.path)
+        self.addCleanup(self.store.close)
+
+    def _write(self, path, docs):
+        with open(path, "w", encoding="utf-8") as f:
+            for doc in docs:
+                f.write(json.dumps(doc, ensure_ascii=False) + "\n")
+
+    def test_reads_lines_by_number(self):
+        self.assertEqual(len(self.store), 3)
+        self.assertEqual(self.store.text(1), "두 번째 문서입니다")
+        self.assertFalse(self.store.is_stale())
+
+    def test_atomic_replace_keeps_old_snapshot(self):
+        tmp_path = os.path.join(self.dir, "docs.jsonl.tmp")
+        self._write(tmp_path, [{"text": "교체"}])
+        os.replace(tmp_path, self.path)
+        self.assertFalse(self.store.is_stale())
+        self.assertEqual(self.store.text(2), "세 번째")
+
+    def test_in_place_rewrite_falls_back_to_file(self):
+        # 제자리에서 더 짧게 덮어쓰면 mmap 을 읽지 않고 파일에서 줄을 찾는다 (SIGBUS 없이)
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"text": "새"}, ensure_ascii=False) + "\n")
+        self.assertTrue(self.store.is_stale())
+        self.assertEqual(self.store.text(0), "새")
+        self.assertIsNone(self.store.get(2))
+        self.assertEqual(self.store.text(2), "")
+
+
+class SemanticAnswerCacheTests(SimpleTestCase):
+    context = ('default', 1, (3, 7))
+
+    def setUp(self):
+        self.cache = SemanticAnswerCache(maxsize=4, min_similarity=0.97)
+        self.hours = np.array([1.0, 0.2, 0.0, 0.0])
+        self.cache.put(self.hours, self.context, {'text': "9시부터 6시까지", 'stop_reason': 'eos'})
+
+    def test_different_questions_with_same_context_do_not_collide(self):
+        # 같은 문서를 찾았더라도 뜻이 다른 질문(유사도 낮음)에는 다른 답변이 필요하다
+        closed_days = np.array([0.6, 0.2, 0.8, 0.0])
+        self.assertEqual(self.cache.lookup(closed_days, self.context), (None, None))
+
+    def test_paraphrase_hits_regardless_of_vector_scale(self):
+        result, similarity = self.cache.lookup(np.array([10.0, 2.1, 0.1, 0.0]), self.context)
+        self.assertEqual(result['text'], "9시부터 6시까지")
+        self.assertGreaterEqual(similarity, 0.97)
+
+    def test_context_must_match(self):
+        self.assertEqual(self.cache.lookup(self.hours, ('default', 2, (3, 7))), (None, None))
+        self.assertEqual(self.cache.lookup(self.hours, ('other', 1, (3, 7))), (None, None))
+
+    def test_truncated_answers_are_not_stored(self):
+        self.cache.put(self.hours, ('default', 1, (5,)), {'text': "잘린", 'stop_reason': 'max_tokens'})
+        self.assertEqual(self.cache.lookup(self.hours, ('default', 1, (5,))), (None, None))
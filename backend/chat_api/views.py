@@ -1,98 +1,499 @@
 from django.shortcuts import render
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
-import torch
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.views.decorators.csrf import csrf_exempt
+from django.conf import settings
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import asyncio
+import threading
 import time
 import re
-from transformers import GenerationConfig
+import json
 
 
 
-# ✅ llama_loader.py 에 있는 모델 로딩 함수 가져오기
-from .llama_loader import get_model_and_tokenizer
-from tools.query_rag import get_rag_prompt
+# ✅ 생성은 이 프로세스의 모델(generation) 또는 추론 서버(inference)에서 처리
+from .generation import PROMPT_TOKEN_BUDGET, count_tokens, generate_local, stream_local
+from .stopping import trim_stop_strings
+from .adapters import UnknownAdapter, get_adapter_registry
+from .admission import AdmissionRejected, get_admission_controller
+from .answer_cache import get_answer_cache
+from . import metrics
+from . import profiling
+from .prefix_cache import get_prefix_cache
+from .single_flight import flight_key, get_single_flight
+from .disconnect import DISCONNECT_SCOPE_KEY
+from . import inference
+from . import warmup
+from tools.query_rag import get_cache_stats, get_index_info, get_rag_context
 
 @api_view(['GET'])
 def test(request):
     return Response({'message': 'Hello, world!'})
 
+@api_view(['GET'])
+def healthz(request):
+    # 프로세스가 살아 있으면 항상 200, 모델 상태는 참고용
+    answer_cache = get_answer_cache()
+    prefix_cache = get_prefix_cache()
+    single_flight = get_single_flight()
+    admission = get_admission_controller()
+    return Response({
+        'status': 'ok',
+        'model': warmup.get_status()['status'],
+        'rag_index': get_index_info(),
+        'rag_cache': get_cache_stats(),
+        'answer_cache': answer_cache.get_stats() if answer_cache else None,
+        'prefix_cache': prefix_cache.get_stats() if prefix_cache else None,
+        'single_flight': single_flight.get_stats() if single_flight else None,
+        'admission': admission.get_stats() if admission else None,
+    })
+
+def metrics_view(request):
+    # Prometheus 텍스트 형식. 단계별 지연 히스토그램, 토큰 수, RAG 사용 여부, 대기열, 메모리
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@staff_member_required
+def profiles(request):
+    # 저장된 프로파일 trace 목록 (최신순). 관리자 로그인 필요
+    return JsonResponse({'traces': profiling.list_traces()})
+
+@staff_member_required
+def profile_download(request, name):
+    path = profiling.trace_path(name)
+    if path is None:
+        raise Http404(name)
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=name)
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAdminUser])
+def adapters(request):
+    # LoRA 어댑터 목록 (GET) / 재시작 없이 로딩·삭제 (POST). 관리자만
+    #  - {"action": "load", "name": ..., "path": ...} : 새로 올리거나 같은 이름이면 교체
+    #  - {"action": "unload", "name": ...} : 기본 어댑터는 내릴 수 없다
+    # 진행 중인 생성이 끝날 때까지 기다렸다가 적용한다
+    if request.method == 'GET':
+        action, args = 'list', ()
+    else:
+        action = request.data.get('action')
+        name = request.data.get('name')
+        if action not in ('load', 'unload') or not name or (action == 'load' and not request.data.get('path')):
+            return Response({'error': "action 은 load (name, path) 또는 unload (name)"}, status=400)
+        args = (name, request.data['path']) if action == 'load' else (name,)
+    try:
+        result = _call_adapters(action, *args)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+    except inference.InferenceServerError as e:
+        return Response({'error': str(e)}, status=503, headers={'Retry-After': str(_inference_retry_after())})
+    return Response({'adapters': result})
+
+
+def _call_adapters(action, *args):
+    # 추론 서버 모드면 모델을 가진 서버의 레지스트리를 조작
+    if inference.is_enabled():
+        result = {'list': inference.list_adapters, 'load': inference.load_adapter,
+                  'unload': inference.unload_adapter}[action](*args)
+        # 답변 캐시는 Django 워커마다 따로 있으므로 이 워커 것은 여기서 비운다
+        # (다른 워커의 캐시는 CHAT_ANSWER_CACHE_SIZE 만큼 밀려날 때까지 남는다)
+        answer_cache = get_answer_cache()
+        if action != 'list' and answer_cache is not None:
+            answer_cache.clear()
+        return result
+    registry = get_adapter_registry()
+    if action != 'list':
+        getattr(registry, action)(*args)
+    return registry.list()
+
+
+def _adapter_name(name):
+    # 지정하지 않으면 기본 어댑터. 없는 이름은 생성할 때 UnknownAdapter (400)
+    return name or getattr(settings, 'CHAT_DEFAULT_ADAPTER', 'default')
+
+
+@api_view(['GET'])
+def readyz(request):
+    # 모델 로딩과 워밍업이 끝나야 200. 로드밸런서는 이걸 보고 트래픽을 보낸다
+    state = warmup.get_status()
+    return Response(state, status=200 if state['status'] == 'ready' else 503)
+
 @api_view(['GET', 'POST'])
 def chat_test(request):
-    print("[INFO] chat_test 실행")
     question = request.GET.get('question') or request.data.get('question') or ''
-    print(f"[INFO] 질문 : {question}")
+    adapter = _adapter_name(request.GET.get('adapter') or request.data.get('adapter'))
 
-    # ❗그 외 일반 질문은 기존 RAG + generate 처리
-    rag_prompt = get_rag_prompt(question, top_k=4)
-    print(f"[INFO] rag_prompt : {rag_prompt}")
+    # 같은 질문이 동시에 들어와 있으면 그 요청의 결과를 같이 받는다
+    try:
+        result, timing, start_all = _answer_coalesced(question, adapter=adapter)
+    except AdmissionRejected as e:
+        _record_rejected('chat_test', e)
+        return Response({'error': str(e)}, status=503, headers={'Retry-After': str(e.retry_after)})
+    except UnknownAdapter as e:
+        metrics.record_request('chat_test', 'bad_request')
+        return Response({'error': str(e)}, status=400)
+    except inference.InferenceServerError as e:
+        metrics.record_request('chat_test', 'unavailable')
+        return Response({'error': str(e)}, status=503, headers={'Retry-After': str(_inference_retry_after())})
 
+    return Response(_answer_payload(question, result, timing, start_all, 'chat_test'))
 
-    #prompt = f"### 질문:\n{question}\n\n### 답변:\n"
-    prompt = rag_prompt
 
-    # print(f"[INFO] prompt : {prompt}")
+def _answer(question, cancel_event=None, adapter=None):
+    # 프로파일링이 켜져 있으면 RAG 검색부터 생성까지 한 trace 로 남긴다
+    with profiling.maybe_profile('chat'):
+        return _answer_pipeline(question, cancel_event, adapter)
 
-    # ✅ 전역 모델 가져오기
-    tokenizer, model = get_model_and_tokenizer()
 
-    print("[INFO] 모델 로딩 완료")
+def _answer_pipeline(question, cancel_event=None, adapter=None):
+    # ❗그 외 일반 질문은 기존 RAG + generate 처리
+    rag_prompt, rag = _rag_context(question)
+    metrics.record_rag(rag)
+    if cancel_event is not None and cancel_event.is_set():
+        return None, None, None
+
+    #prompt = f"### 질문:\n{question}\n\n### 답변:\n"
+    prompt = rag_prompt
 
-    # 🔄 전처리
+    # 🤖 생성 : 추론 서버 모드면 서버에, 아니면 이 프로세스의 모델(스케줄러 포함)로 처리
     start_all = time.time()
-    start_preprocess = time.time()
-    print("[INFO] 전처리 시작")
-    inputs = tokenizer(prompt, return_tensors="pt", padding=True, truncation=True, max_length=1024)
-    inputs = {k: v.to(model.device) for k, v in inputs.items()}
-    input_ids = inputs["input_ids"]
-    attention_mask = inputs["attention_mask"]
-    end_preprocess = time.time()
-    print(f"[INFO] 전처리 완료 : {end_preprocess - start_preprocess}초")
-
-    # 🤖 생성
-    start_gen = time.time()
-
-    print("[INFO] GenerationConfig 옵션 설정")
-
-    generation_config = GenerationConfig(
-        temperature=0.1,               # [샘플링 온도] 낮을수록 결정적 → 항상 비슷한 답변 생성됨 (0에 가까우면 거의 greedy)
-        top_k=50,                       # [상위 k 토큰 제한] 확률이 가장 높은 1개의 토큰만 후보로 사용 (탐색 범위 축소)
-        do_sample=True,              # [샘플링 여부] False면 확률이 가장 높은 토큰을 항상 선택 (deterministic)
-        max_new_tokens=150,             # [최대 생성 토큰 수] 답변의 최대 길이를 제한
-        eos_token_id=tokenizer.eos_token_id
+    result = _generate_cached(prompt, rag, cancel_event=cancel_event, adapter=adapter)
+    timing = {k: result[k] for k in _TIMING_KEYS if k in result}
+    _record_generation(question, prompt, rag, result)
+    return result, timing, start_all
+
+
+def _record_generation(question, prompt, rag, result):
+    # 지표는 항상, 프롬프트 전체가 들어간 로그는 표본만 남긴다
+    metrics.record_generation(result)
+    metrics.log_request(
+        question=question,
+        prompt=prompt,
+        doc_ids=rag['doc_ids'],
+        top_score=rag['top_score'],
+        bm25_score=rag['bm25_score'],
+        rag_timing=rag['timing'],
+        **{k: v for k, v in result.items() if k != 'text'},
+        answer=result['text'],
     )
 
-    # 🤖 생성 (with torch.no_grad() 추가)
-    start_gen = time.time()
-    with torch.no_grad():
-        output_ids = model.generate(
-            input_ids=input_ids,
-            attention_mask=attention_mask,
-            generation_config=generation_config
-        )
-
-    end_gen = time.time()
-    print(f"[INFO] 생성 완료 : {end_gen - start_gen}초")
-    # 📤 결과 디코딩
-    # output_text = tokenizer.decode(output_ids[0], skip_special_tokens=True)
-    # answer = output_text.strip()
-
-    
-    # 생성된 텍스트 디코딩
-    full_output = tokenizer.decode(output_ids[0][input_ids.shape[1]:], skip_special_tokens=True)
-
-    # 첫 문단까지만 사용
+
+def _inference_retry_after():
+    # 추론 서버가 죽었거나 재시작 중이면 잠시 뒤 다시 시도하라고 알린다 (초)
+    return getattr(settings, 'CHAT_INFERENCE_RETRY_AFTER', 5)
+
+
+def _record_rejected(endpoint, e):
+    # 요청마다 로그를 찍지 않는다. 거절 수는 chat_requests_total{outcome="rejected"} 로 본다
+    metrics.record_request(endpoint, 'rejected')
+
+
+def _answer_coalesced(question, cancel_event=None, adapter=None):
+    # (result, timing, start_all). 다른 요청의 결과를 받았으면 result['coalesced'] 가 True
+    # 생성은 같이 기다리는 요청이 모두 취소됐을 때만 취소된다
+    flight = get_single_flight()
+    if flight is None:
+        return _answer(question, cancel_event, adapter)
+
+    start_wait = time.time()
+    (result, timing, start_all), shared = flight.do(flight_key(question, top_k=4, adapter=adapter),
+                                                    lambda group_cancel: _answer(question, group_cancel, adapter),
+                                                    cancel_event)
+    if result is None:
+        return None, None, None
+    if shared:
+        return {**result, 'coalesced': True}, dict(timing), start_wait
+    return result, dict(timing), start_all
+
+
+_TIMING_KEYS = ('queue_wait', 'queue_depth', 'preprocess', 'generation', 'cached_prefix_tokens', 'acceptance_rate',
+                'batch_size')
+
+
+def _rag_context(question):
+    # 프롬프트가 MAX_INPUT_LENGTH 에서 잘리지 않도록 Gemma 토크나이저 기준 예산 안에서 조립
+    return get_rag_context(question, top_k=4, count_tokens=count_tokens, token_budget=PROMPT_TOKEN_BUDGET)
+
+
+def _answer_payload(question, result, timing, start_all, endpoint):
+    # 첫 문단까지만 사용 (CHAT_STOP_AT_NEWLINE 이면 생성 자체가 첫 줄바꿈에서 멈춘다)
+    full_output = result['text']
     answer = full_output.strip().split("\n")[0]
-    
-    print(f"[INFO] answer : {answer}")    
 
     end_all = time.time()
+    timing['total'] = end_all - start_all
+    metrics.record_request(endpoint, 'ok', timing['total'])
 
-    return Response({
+    return {
         'question': question,
         'answer': answer,
-        'timing': {
-            'preprocess': round(end_preprocess - start_preprocess, 2),
-            'generation': round(end_gen - start_gen, 2),
-            'total': round(end_all - start_all, 2)
-        }
-    })
+        'adapter': result.get('adapter'),
+        'stop_reason': result['stop_reason'],
+        'generated_tokens': result['generated_tokens'],
+        'cache_hit': result.get('cache_hit', False),
+        'coalesced': result.get('coalesced', False),
+        'timing': {k: round(v, 2) if isinstance(v, float) else v for k, v in timing.items()}
+    }
+
+
+def _generate(prompt, cancel_event=None, prefix=None, adapter=None):
+    # 추론 서버 모드에서는 취소가 전달되지 않는다 (서버 쪽 생성은 끝까지 진행)
+    if inference.is_enabled():
+        return inference.generate(prompt, prefix=prefix, adapter=adapter)
+    return generate_local(prompt, cancel_event=cancel_event, prefix=prefix, adapter=adapter)
+
+
+def _generate_cached(prompt, rag, cancel_event=None, adapter=None):
+    # 의미가 같은 질문 + 같은 RAG 문맥 + 같은 어댑터의 답변이 캐시에 있으면 생성을 건너뛴다
+    cache = _answer_cache_for(rag)
+    if cache is not None:
+        cached, _ = cache.lookup(rag['query_vec'], _cache_context(rag, adapter))
+        if cached is not None:
+            return {**cached, 'preprocess': 0.0, 'generation': 0.0, 'adapter': adapter, 'cache_hit': True}
+
+    # 캐시에 없을 때만 입장 제어를 거친다. 대기열이 가득 찼거나 마감이 지나면 AdmissionRejected
+    with _admit(cancel_event) as queue:
+        result = _generate(prompt, cancel_event=cancel_event, prefix=rag['prefix'], adapter=adapter)
+    # 취소돼 잘린 답변은 저장하지 않는다
+    if cache is not None and result['stop_reason'] != 'cancelled':
+        cache.put(rag['query_vec'], _cache_context(rag, adapter), _cacheable(result))
+    return {**result, **queue, 'cache_hit': False}
+
+
+@contextmanager
+def _admit(cancel_event=None):
+    controller = get_admission_controller()
+    if controller is None:
+        yield {}
+        return
+    with controller.admit(cancel_event) as queue:
+        yield queue
+
+
+def _answer_cache_for(rag):
+    # RAG 문맥이 없는 질문은 문맥이 전부 같은 () 라서 비슷하기만 한 다른 질문과 섞이기 쉽다. 캐시하지 않는다
+    if not rag['doc_ids']:
+        return None
+    return get_answer_cache()
+
+
+def _cache_context(rag, adapter=None):
+    # 인덱스가 교체되면 같은 문서 id 라도 내용이 바뀌었을 수 있으므로 인덱스 버전까지 같아야 재사용
+    # 어댑터마다 답변이 다르므로 어댑터 이름도 같아야 한다
+    return (adapter, rag['index_version'], rag['doc_ids'])
+
+
+def _cacheable(result):
+    return {k: result[k] for k in ('text', 'stop_reason', 'generated_tokens')}
+
+
+def _stream_cached(prompt, rag, adapter=None):
+    cache = _answer_cache_for(rag)
+    if cache is not None:
+        cached, _ = cache.lookup(rag['query_vec'], _cache_context(rag, adapter))
+        if cached is not None:
+            yield 'token', cached['text']
+            yield 'done', {**cached, 'preprocess': 0.0, 'generation': 0.0, 'adapter': adapter, 'cache_hit': True}
+            return
+
+    with _admit() as queue:
+        for event, data in _stream(prompt, prefix=rag['prefix'], adapter=adapter):
+            if event == 'done':
+                if cache is not None:
+                    cache.put(rag['query_vec'], _cache_context(rag, adapter), _cacheable(data))
+                data = {**data, **queue, 'cache_hit': False}
+            yield event, data
+
+
+def _stream_answer(question, adapter=None):
+    with profiling.maybe_profile('chat_stream'):
+        rag_prompt, rag = _rag_context(question)
+        metrics.record_rag(rag)
+        for event, data in _stream_cached(rag_prompt, rag, adapter):
+            if event == 'done':
+                _record_generation(question, rag_prompt, rag, data)
+            yield event, data
+
+
+def _stream(prompt, prefix=None, adapter=None):
+    if inference.is_enabled():
+        return inference.stream(prompt, prefix=prefix, adapter=adapter)
+    return stream_local(prompt, prefix=prefix, adapter=adapter)
+
+
+def _sse(data, event=None):
+    # Server-Sent Events 한 건 직렬화
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@api_view(['GET', 'POST'])
+def chat_stream(request):
+    question = request.GET.get('question') or request.data.get('question') or ''
+    adapter = _adapter_name(request.GET.get('adapter') or request.data.get('adapter'))
+
+    start_all = time.time()
+
+    # 스트림을 시작하기 전에 대기열이 가득 찼으면 바로 거절 (대기 중 마감이 지나면 error 이벤트로 알린다)
+    admission = get_admission_controller()
+    if admission is not None:
+        try:
+            admission.check()
+        except AdmissionRejected as e:
+            _record_rejected('chat_stream', e)
+            return Response({'error': str(e)}, status=503, headers={'Retry-After': str(e.retry_after)})
+
+    # 중단 문자열이 중간까지만 생성된 상태로 전송되지 않도록 끝부분은 잠시 보류
+    stop_strings = getattr(settings, 'CHAT_STOP_STRINGS', ())
+    holdback = max((len(s) for s in stop_strings), default=1) - 1
+
+    def event_stream():
+        first_token_at = None
+        generated = ""
+        sent = 0
+        result = None
+        try:
+            for event, data in stream:
+                if event == 'done':
+                    result = data
+                    break
+                if first_token_at is None:
+                    first_token_at = time.time()
+                generated += data
+
+                # chat_test 와 동일하게 첫 문단까지만 전송
+                partial = trim_stop_strings(generated, stop_strings).lstrip().split("\n")[0]
+                partial = partial[:len(partial) - holdback]
+                if len(partial) > sent:
+                    yield _sse({'token': partial[sent:]})
+                    sent = len(partial)
+        except AdmissionRejected as e:
+            _record_rejected('chat_stream', e)
+            yield _sse({'error': str(e), 'retry_after': e.retry_after}, event='error')
+            return
+        except UnknownAdapter as e:
+            metrics.record_request('chat_stream', 'bad_request')
+            yield _sse({'error': str(e)}, event='error')
+            return
+        except inference.InferenceServerError as e:
+            # 응답 헤더는 이미 나갔으므로 error 이벤트로 알린다
+            metrics.record_request('chat_stream', 'unavailable')
+            yield _sse({'error': str(e), 'retry_after': _inference_retry_after()}, event='error')
+            return
+
+        answer = result['text'].strip().split("\n")[0]
+        if len(answer) > sent:
+            yield _sse({'token': answer[sent:]})
+        end_all = time.time()
+        metrics.record_request('chat_stream', 'ok', end_all - start_all)
+
+        yield _sse({
+            'question': question,
+            'answer': answer,
+            'adapter': result.get('adapter'),
+            'stop_reason': result['stop_reason'],
+            'generated_tokens': result['generated_tokens'],
+            'cache_hit': result['cache_hit'],
+            'coalesced': coalesced,
+            'timing': {
+                **{k: round(result[k], 2) for k in ('queue_wait', 'queue_depth') if k in result},
+                'preprocess': round(result['preprocess'], 2),
+                'generation': round(result['generation'], 2),
+                'cached_prefix_tokens': result.get('cached_prefix_tokens', 0),
+                **({'acceptance_rate': round(result['acceptance_rate'], 2)} if 'acceptance_rate' in result else {}),
+                'ttft': round((first_token_at or end_all) - start_all, 2),
+                'total': round(end_all - start_all, 2)
+            }
+        }, event='done')
+
+    # 같은 질문의 스트림이 진행 중이면 처음부터 같은 토큰 스트림을 받는다
+    flight = get_single_flight()
+    if flight is None:
+        stream, coalesced = _stream_answer(question, adapter), False
+    else:
+        stream, coalesced = flight.stream(flight_key(question, top_k=4, stream=True, adapter=adapter),
+                                          lambda: _stream_answer(question, adapter))
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+# ===== ASGI 용 비동기 엔드포인트 =====
+# 생성은 크기가 제한된 스레드 풀에서 돌리므로 느린 생성이 이벤트 루프나 다른 요청(test/ 등)을 막지 않는다
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=getattr(settings, 'CHAT_GENERATION_WORKERS', 2),
+                                           thread_name_prefix="chat-generate")
+    return _executor
+
+
+def _rejected(e):
+    _record_rejected('chat_async', e)
+    response = JsonResponse({'error': str(e)}, status=503, json_dumps_params={'ensure_ascii': False})
+    response['Retry-After'] = str(e.retry_after)
+    return response
+
+
+@csrf_exempt
+async def chat_async(request):
+    question = request.GET.get('question') or ''
+    adapter = request.GET.get('adapter')
+    if request.method == 'POST':
+        try:
+            body = json.loads(request.body or b'{}')
+        except ValueError:
+            body = request.POST
+        question = question or body.get('question') or ''
+        adapter = adapter or body.get('adapter')
+    adapter = _adapter_name(adapter)
+
+    # 워커 스레드 대기열에 쌓기 전에 입장 제어 대기열이 가득 찼는지 먼저 확인
+    admission = get_admission_controller()
+    if admission is not None:
+        try:
+            admission.check()
+        except AdmissionRejected as e:
+            return _rejected(e)
+
+    cancel_event = threading.Event()
+    loop = asyncio.get_running_loop()
+    job = loop.run_in_executor(_get_executor(), _answer_coalesced, question, cancel_event, adapter)
+
+    disconnected = request.scope.get(DISCONNECT_SCOPE_KEY) if hasattr(request, 'scope') else None
+    try:
+        if disconnected is not None:
+            watch = asyncio.ensure_future(disconnected.wait())
+            done, _ = await asyncio.wait({job, watch}, return_when=asyncio.FIRST_COMPLETED)
+            watch.cancel()
+            if job not in done:
+                # 클라이언트가 떠났으면 다음 토큰 경계에서 생성을 멈춘다
+                cancel_event.set()
+                metrics.record_request('chat_async', 'disconnected')
+                return HttpResponse(status=499)
+        result, timing, start_all = await job
+    except asyncio.CancelledError:
+        cancel_event.set()
+        raise
+    except AdmissionRejected as e:
+        return _rejected(e)
+    except UnknownAdapter as e:
+        metrics.record_request('chat_async', 'bad_request')
+        return JsonResponse({'error': str(e)}, status=400, json_dumps_params={'ensure_ascii': False})
+    except inference.InferenceServerError as e:
+        metrics.record_request('chat_async', 'unavailable')
+        response = JsonResponse({'error': str(e)}, status=503, json_dumps_params={'ensure_ascii': False})
+        response['Retry-After'] = str(_inference_retry_after())
+        return response
+
+    return JsonResponse(_answer_payload(question, result, timing, start_all, 'chat_async'), json_dumps_params={'ensure_ascii': False})
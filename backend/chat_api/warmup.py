@@ -0,0 +1,94 @@
+# chat_api/warmup.py
+# 서버 기동을 막지 않고 백그라운드에서 모델 로딩 + 더미 생성으로 워밍업
+# 상태 : idle → loading → warming → ready (실패 시 failed)
+# 워밍업을 하지 않는 설정이면 첫 요청이 모델을 로딩한 시점에 idle → ready
+# failed 는 영구 상태가 아니다. 모델이 올라와 있으면 ready 로 돌리고, 아니면 CHAT_WARMUP_RETRY_INTERVAL 뒤에 다시 시도
+import threading
+import time
+
+from django.conf import settings
+from transformers import GenerationConfig
+
+from . import llama_loader
+
+WARMUP_QUESTION = "안녕하세요"
+
+_state = {'status': 'idle', 'error': None, 'started_at': None, 'ready_at': None, 'failed_at': None}
+_state_lock = threading.Lock()
+_thread = None
+
+
+def _set_status(status, error=None):
+    with _state_lock:
+        _state['status'] = status
+        _state['error'] = error
+        if status == 'ready':
+            _state['ready_at'] = time.time()
+        elif status == 'failed':
+            _state['failed_at'] = time.time()
+
+
+def _warmup():
+    from .generation import build_generation_config, generate_batch
+
+    try:
+        _set_status('loading')
+        tokenizer, model = llama_loader.get_model_and_tokenizer()
+
+        _set_status('warming')
+        # RAG 임베딩 모델도 첫 요청 경로에 있으므로 같이 한 번 돌려둔다
+        from tools.query_rag import get_rag_prompt
+        prompt = get_rag_prompt(WARMUP_QUESTION)
+
+        # 짧은 더미 생성으로 커널 컴파일 / 캐시 할당을 미리 해둔다
+        config = GenerationConfig.from_dict({**build_generation_config(tokenizer).to_dict(), 'max_new_tokens': 8})
+        start = time.time()
+        generate_batch(tokenizer, model, [prompt], generation_config=config)
+        print(f"[INFO] 워밍업 생성 완료 : {time.time() - start}초")
+
+        _set_status('ready')
+    except Exception as e:
+        print(f"[ERROR] 모델 워밍업 실패 : {e}")
+        _set_status('failed', str(e))
+
+
+def start_warmup():
+    # 여러 번 호출해도 워밍업 스레드는 하나만 띄운다. 실패한 뒤에만 다시 띄울 수 있다
+    global _thread
+    with _state_lock:
+        if _thread is not None and _state['status'] != 'failed':
+            return
+        _state['started_at'] = time.time()
+        _state['status'] = 'loading'  # 재시도가 동시에 들어와도 스레드는 하나만
+        _thread = threading.Thread(target=_warmup, name="model-warmup", daemon=True)
+        _thread.start()
+
+
+def get_status():
+    # 추론 서버 모드에서는 모델을 가진 서버 프로세스의 상태를 그대로 보고
+    from . import inference
+    if inference.is_enabled():
+        try:
+            return inference.get_status()
+        except inference.InferenceServerError as e:
+            return {'status': 'unavailable', 'error': str(e), 'started_at': None, 'ready_at': None,
+                    'failed_at': None}
+
+    retry = False
+    with _state_lock:
+        if _state['status'] in ('idle', 'failed') and llama_loader.model is not None:
+            # 첫 요청이 모델을 로딩했거나, 모델은 올라왔는데 더미 생성만 실패한 경우 (error 는 남겨둔다)
+            _state['status'] = 'ready'
+            _state['ready_at'] = time.time()
+        elif _state['status'] == 'failed':
+            retry_interval = getattr(settings, 'CHAT_WARMUP_RETRY_INTERVAL', 30)
+            retry = retry_interval is not None and time.time() - _state['failed_at'] >= retry_interval
+        state = dict(_state)
+    if retry:
+        print("[INFO] 모델 워밍업 재시도")
+        start_warmup()
+    return state
+
+
+def is_ready():
+    return get_status()['status'] == 'ready'
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_asgi_application()
+
+# 클라이언트 연결 끊김을 chat_async 뷰에 알려서 버려진 생성을 멈추게 한다
+from chat_api.disconnect import DisconnectWatcherMiddleware
+
+application = DisconnectWatcherMiddleware(application)
@@ -135,3 +135,106 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# ===== 챗봇 추론 설정 =====
+# 생성 스케줄러 : "none" (요청마다 generate) | "batch" | "continuous"
+#  - batch      : CHAT_BATCH_WINDOW_MS 동안 들어온 요청을 최대 CHAT_BATCH_MAX_SIZE 개까지 묶어서 generate
+#  - continuous : 토큰 단위로 요청을 합류/이탈시키는 디코드 엔진, 동시에 최대 CHAT_BATCH_MAX_SIZE 개 시퀀스
+CHAT_SCHEDULER = "none"
+CHAT_BATCH_WINDOW_MS = 20
+CHAT_BATCH_MAX_SIZE = 8
+
+# 생성 중단 조건 : 답변은 첫 줄만 사용하므로 그 이후는 생성하지 않는다
+CHAT_STOP_AT_NEWLINE = True
+CHAT_STOP_STRINGS = []
+CHAT_STOP_AT_END_OF_TURN = True
+
+# 모델 로딩 방식 : "peft" (베이스 + LoRA 어댑터) | "merged" (LoRA 를 병합한 safetensors 체크포인트를 캐시해서 로딩)
+CHAT_MODEL_LOAD_MODE = "peft"
+
+# 기동 시 백그라운드 모델 로딩 + 더미 생성 워밍업. /readyz 는 완료 후에만 200
+CHAT_WARMUP_ON_STARTUP = True
+# 워밍업(모델 로딩)이 실패했을 때 /readyz 조회 시 다시 시도하는 간격 (초). None 이면 재시도하지 않음
+CHAT_WARMUP_RETRY_INTERVAL = 30
+
+# 추론 서버 모드 : 모델은 별도 프로세스(python manage.py inference_server)에서 한 번만 로딩하고
+# Django 워커들은 CHAT_INFERENCE_SOCKET (Unix 소켓) 으로 생성 요청을 보낸다
+CHAT_INFERENCE_SERVER = False
+CHAT_INFERENCE_SOCKET = BASE_DIR / "inference.sock"
+CHAT_INFERENCE_RETRY_AFTER = 5  # 추론 서버에 연결할 수 없을 때 503 응답의 Retry-After (초)
+
+# chat_async (ASGI) 엔드포인트에서 동시에 생성을 돌리는 워커 스레드 수. 나머지 요청은 대기
+CHAT_GENERATION_WORKERS = 2
+
+# 답변 캐시 : 질문 임베딩 코사인 유사도가 CHAT_ANSWER_CACHE_SIMILARITY 이상이고 RAG 문맥(문서 id)이 같으면 생성 없이 저장된 답변 사용
+# 뜻이 다른 질문이 같은 문서를 찾는 경우가 많으므로, 실제 질문 로그로 임계값을 확인한 뒤에 켠다. 문맥이 없는 질문은 캐시하지 않음
+CHAT_ANSWER_CACHE_ENABLED = False
+CHAT_ANSWER_CACHE_SIZE = 512
+CHAT_ANSWER_CACHE_SIMILARITY = 0.97
+
+# 접두어 KV 캐시 : 헤더 + RAG 문맥이 같은 요청은 그 부분의 KV 를 재사용하고 질문만 prefill (요청 하나씩 생성할 때만, 0 이면 끔)
+CHAT_PREFIX_CACHE_SIZE = 32
+
+# 모델 dtype / 양자화 : GPU 가 없으면 "float32" 또는 "bfloat16" 권장 (CPU 는 float16 행렬곱이 느리다)
+#  - CHAT_MODEL_QUANTIZATION : "none" | "int8" (torch 동적 양자화) | "int4" (torchao weight-only, 병합 체크포인트 사용)
+#  - CHAT_CPU_THREADS : CPU 추론 스레드 수, None 이면 물리 코어 수로 추정
+CHAT_MODEL_DTYPE = "float16"
+CHAT_MODEL_QUANTIZATION = "none"
+CHAT_CPU_THREADS = None
+
+# 추측 디코딩 (요청 하나씩 생성할 때만) : "none" | "prompt_lookup" (RAG 문맥에서 n-gram 복사) | "draft" (CHAT_DRAFT_MODEL 이 제안)
+# 초안 토큰 채택률은 응답 timing.acceptance_rate 로 확인
+CHAT_SPECULATIVE = "none"
+CHAT_PROMPT_LOOKUP_TOKENS = 10
+CHAT_DRAFT_MODEL = None
+
+# 동시에 들어온 같은 질문(정규화 후)은 한 번만 검색/생성하고 결과(스트리밍이면 토큰 스트림)를 공유
+CHAT_SINGLE_FLIGHT = True
+
+# 입장 제어 : 동시에 생성하는 요청은 최대 CHAT_ADMISSION_MAX_ACTIVE 개, 나머지는 최대 CHAT_ADMISSION_MAX_QUEUE 개까지 대기
+# 대기열이 가득 차면 503 + Retry-After, CHAT_ADMISSION_DEADLINE 초 안에 차례가 오지 않으면 생성하지 않고 503
+#  - CHAT_ADMISSION_MAX_ACTIVE 가 None 이면 CHAT_SCHEDULER 가 batch / continuous 일 때 CHAT_BATCH_MAX_SIZE, 아니면 4
+#  - 제한과 대기열은 Django 워커 프로세스마다 따로다. 추론 서버 모드에서 서버가 받는 동시 요청은 워커 수 × MAX_ACTIVE 까지
+CHAT_ADMISSION_ENABLED = True
+CHAT_ADMISSION_MAX_ACTIVE = None
+CHAT_ADMISSION_MAX_QUEUE = 16
+CHAT_ADMISSION_DEADLINE = 30.0
+
+# 요청 로그 : 프롬프트 / 답변 / 단계별 시간을 CHAT_LOG_SAMPLE_RATE 비율의 요청만 JSON 한 줄로 기록 (지표는 /metrics)
+CHAT_LOG_SAMPLE_RATE = 0.01
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "message": {"format": "%(message)s"},
+    },
+    "handlers": {
+        "requests": {"class": "logging.StreamHandler", "formatter": "message"},
+    },
+    "loggers": {
+        "chat_api.requests": {"handlers": ["requests"], "level": "INFO", "propagate": False},
+    },
+}
+
+# 프로파일링 (기본 꺼짐) : CHAT_PROFILE_SAMPLE_RATE 비율의 요청, 또는 CHAT_PROFILE_SLOW_SECONDS 초보다 오래 걸린 요청의 trace 를 저장
+#  - CHAT_PROFILE_SLOW_SECONDS 를 쓰면 끝나야 느렸는지 알 수 있으므로 모든 요청을 프로파일링한다 (한 번에 한 요청씩)
+#    그동안 동시에 들어온 요청은 기록되지 않고, 그중 느렸던 요청 수는 chat_profiles_total{outcome="missed_slow"}
+#  - CHAT_PROFILE_BACKEND : "cprofile" (.prof) | "torch" (torch.profiler, .json chrome trace)
+#    cProfile 은 스케줄러 스레드의 생성을 볼 수 없어 CHAT_SCHEDULER 가 batch / continuous 면 torch 로 기록
+#    추론 서버 모드면 생성 trace 는 추론 서버 프로세스가 따로 남긴다
+#  - 저장된 trace 는 /profiles (관리자 로그인) 에서 목록 확인 / 다운로드
+CHAT_PROFILING_ENABLED = False
+CHAT_PROFILE_SAMPLE_RATE = 0.0
+CHAT_PROFILE_SLOW_SECONDS = None
+CHAT_PROFILE_BACKEND = "cprofile"
+CHAT_PROFILE_DIR = BASE_DIR / "logs" / "profiles"
+CHAT_PROFILE_KEEP = 50
+
+# LoRA 어댑터 여러 개 : 베이스 모델은 하나만 올리고 어댑터(이름 → 경로)를 등록해 요청의 adapter 파라미터로 고른다
+#  - 비어 있으면 ADAPTER_PATH 하나를 CHAT_DEFAULT_ADAPTER 이름으로 사용. adapter 를 지정하지 않은 요청도 기본 어댑터
+#  - 배치는 같은 어댑터 요청끼리만 묶는다. 어댑터를 바꿀 때는 진행 중인 생성이 끝나길 기다린다
+#  - 재시작 없이 로딩 / 삭제 : POST /adapters (관리자). CHAT_MODEL_LOAD_MODE="peft" + 양자화 없음에서만 여러 개 사용 가능
+CHAT_ADAPTERS = {}
+CHAT_DEFAULT_ADAPTER = "default"
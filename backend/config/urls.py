@@ -20,6 +20,14 @@ from chat_api import views
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('test/', views.test, name='test'),
+    path('healthz', views.healthz, name='healthz'),
+    path('readyz', views.readyz, name='readyz'),
+    path('metrics', views.metrics_view, name='metrics'),
+    path('profiles', views.profiles, name='profiles'),
+    path('profiles/<str:name>', views.profile_download, name='profile_download'),
+    path('adapters', views.adapters, name='adapters'),
     path('chat_test', views.chat_test, name='chat_test'),
+    path('chat_stream', views.chat_stream, name='chat_stream'),
+    path('chat_async', views.chat_async, name='chat_async'),
 
 ]
@@ -0,0 +1,45 @@
+# bench_async.py
+# 채팅 생성이 돌고 있는 동안 가벼운 엔드포인트(test/)의 응답 지연이 어떻게 변하는지 측정
+# 서버를 먼저 띄운 뒤 실행 (예: uvicorn config.asgi:application --port 4000)
+# 사용법 : python hugging_face/bench_async.py [서버 주소] [채팅 엔드포인트] [동시 채팅 수]
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+base_url = sys.argv[1] if len(sys.argv) > 1 else "http://127.0.0.1:4000"
+chat_endpoint = sys.argv[2] if len(sys.argv) > 2 else "chat_async"
+concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+
+QUESTION = "엔큐브의 창립일은 언제야?"
+PROBES = 20
+
+
+def get(path):
+    start = time.time()
+    with urllib.request.urlopen(f"{base_url}/{path}", timeout=300) as response:
+        response.read()
+    return time.time() - start
+
+
+def probe(label):
+    latencies = sorted(get("test/") for _ in range(PROBES))
+    print(f" - test/ {label}: p50 {latencies[len(latencies) // 2] * 1000:.1f}ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f}ms")
+
+
+print(f"⏱️ {base_url} / {chat_endpoint} 동시 채팅 {concurrency}건")
+probe("유휴 상태")
+
+chat_latencies = []
+chat_path = f"{chat_endpoint}?question={urllib.parse.quote(QUESTION)}"
+threads = [threading.Thread(target=lambda: chat_latencies.append(get(chat_path))) for _ in range(concurrency)]
+for t in threads:
+    t.start()
+time.sleep(0.5)  # 채팅 요청이 서버에 도착할 때까지 잠시 대기
+
+probe("채팅 생성 중")
+for t in threads:
+    t.join()
+print(f" - {chat_endpoint}: 평균 {sum(chat_latencies) / len(chat_latencies):.2f}초, 최대 {max(chat_latencies):.2f}초")
@@ -0,0 +1,68 @@
+# bench_batching.py
+# 동시 요청 부하에서 기존 경로(요청마다 generate), 배치 스케줄러, continuous batching 엔진의 처리량 비교
+# 사용법 : python hugging_face/bench_batching.py [동시 사용자 수] [사용자당 요청 수]
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+import django
+from django.conf import settings
+# 앱 초기화가 기본 설정 모델을 백그라운드로 따로 올리고 더미 생성을 돌리면 측정이 섞인다
+settings.CHAT_WARMUP_ON_STARTUP = False
+django.setup()
+
+from chat_api.llama_loader import get_model_and_tokenizer
+from chat_api.generation import generate_batch
+from chat_api.batching import BatchScheduler
+from chat_api.engine import ContinuousBatchingEngine
+
+QUESTIONS = [
+    "엔큐브의 창립일은 언제야?",
+    "엔큐브 전화번호 알려줘",
+    "엔큐브 이메일이 어떻게 되니?",
+    "엔큐브 오시는 길 알려줘",
+]
+
+concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+requests_per_user = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+prompts = [f"<start_of_turn>user\n{q}<end_of_turn>\n<start_of_turn>model\n" for q in QUESTIONS]
+
+
+def run(name, call):
+    latencies = []
+
+    def user(i):
+        for j in range(requests_per_user):
+            start = time.time()
+            call(prompts[(i + j) % len(prompts)])
+            latencies.append(time.time() - start)
+
+    start_all = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(user, range(concurrency)))
+    elapsed = time.time() - start_all
+
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f" - {name}: {len(latencies) / elapsed:.2f} req/s, "
+          f"평균 {sum(latencies) / len(latencies):.2f}초, p95 {p95:.2f}초, 전체 {elapsed:.2f}초")
+
+
+print("🔄 모델 로딩 중...")
+tokenizer, model = get_model_and_tokenizer()
+generate_batch(tokenizer, model, [prompts[0]])  # 워밍업
+
+print(f"\n⏱️ 동시 사용자 {concurrency}명 x {requests_per_user}회 요청")
+run("기존 경로 (요청마다 generate)", lambda p: generate_batch(tokenizer, model, [p]))
+
+scheduler = BatchScheduler(window_ms=20, max_batch_size=concurrency)
+run("배치 스케줄러", lambda p: scheduler.submit(p).result())
+
+engine = ContinuousBatchingEngine(max_batch_size=concurrency)
+run("continuous batching 엔진", lambda p: engine.submit(p).result())
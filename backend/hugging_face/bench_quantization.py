@@ -0,0 +1,99 @@
+# bench_quantization.py
+# CPU 에서 dtype / 양자화 방식별 모델 로딩 시간, 생성 속도(tokens/sec), 최대 메모리(RSS) 비교
+# 설정마다 별도 프로세스에서 돌려서 최대 RSS 가 서로 섞이지 않도록 한다
+# 사용법 : python hugging_face/bench_quantization.py [반복 횟수] [스레드 수]
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+CONFIGS = [
+    ("float32", "none"),
+    ("bfloat16", "none"),
+    ("float32", "int8"),
+    ("bfloat16", "int4"),
+]
+
+QUESTIONS = [
+    "엔큐브의 창립일은 언제야?",
+    "엔큐브 전화번호 알려줘",
+    "엔큐브 이메일이 어떻게 되니?",
+    "엔큐브 오시는 길 알려줘",
+]
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # 리눅스는 KB 단위
+
+
+def child(dtype, quantization, repeats, threads):
+    # 한 가지 설정만 측정하고 결과를 JSON 한 줄로 출력
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+    import django
+    from django.conf import settings
+    # 앱 초기화가 기본 설정 모델을 백그라운드로 따로 올리면 메모리 / 스레드 수 / 속도가 섞인다
+    settings.CHAT_WARMUP_ON_STARTUP = False
+    django.setup()
+
+    from transformers import AutoTokenizer
+    from chat_api.generation import build_generation_config, generate_batch
+    from chat_api.llama_loader import BASE_MODEL_NAME, build_model
+    from chat_api.quantization import configure_cpu_threads
+
+    threads = configure_cpu_threads(threads)
+    start_load = time.time()
+    tokenizer = AutoTokenizer.from_pretrained(BASE_MODEL_NAME, local_files_only=True)
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    model = build_model("merged", dtype, quantization)
+    load_time = time.time() - start_load
+
+    config = build_generation_config(tokenizer)
+    config.do_sample = False  # 설정끼리 같은 길이를 생성하도록 greedy
+    config.max_new_tokens = 64
+    prompts = [f"<start_of_turn>user\n{q}<end_of_turn>\n<start_of_turn>model\n" for q in QUESTIONS]
+    generate_batch(tokenizer, model, [prompts[0]], generation_config=config)  # 워밍업
+
+    tokens, generation = 0, 0.0
+    for _ in range(repeats):
+        for prompt in prompts:
+            results, timing = generate_batch(tokenizer, model, [prompt], generation_config=config)
+            tokens += results[0]['generated_tokens']
+            generation += timing['generation']
+
+    print(json.dumps({
+        'dtype': dtype,
+        'quantization': quantization,
+        'threads': threads,
+        'load': load_time,
+        'tokens_per_sec': tokens / generation if generation else 0.0,
+        'peak_rss_mb': peak_rss_mb(),
+    }))
+
+
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    threads = sys.argv[2] if len(sys.argv) > 2 else "0"
+
+    print(f"⏱️ CPU 양자화 비교 (질문 {len(QUESTIONS)}개 x {repeats}회)")
+    for dtype, quantization in CONFIGS:
+        proc = subprocess.run([sys.executable, __file__, "--child", dtype, quantization, str(repeats), threads],
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f" - {dtype}/{quantization}: 실패 ({proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else proc.returncode})")
+            continue
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(f" - {dtype}/{quantization}: 로딩 {result['load']:.2f}초, {result['tokens_per_sec']:.2f} tokens/sec, "
+              f"최대 RSS {result['peak_rss_mb']:.0f}MB (스레드 {result['threads']}개)")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(sys.argv[2], sys.argv[3], int(sys.argv[4]), int(sys.argv[5]) or None)
+    else:
+        main()
@@ -0,0 +1,67 @@
+# bench_index.py
+# 합성 코퍼스로 FAISS 인덱스 종류별 recall@k (Flat 기준), 질의 지연, 인덱스 메모리 비교
+# 사용법 : python tools/bench_index.py [문서 수] [질의 수]
+
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from tools.rag_index import configure_search, make_index, min_train_size
+
+VECTOR_DIM = 768  # ko-sroberta-multitask 출력 차원
+TOP_K = 4
+SPECS = ["Flat", "IVF1024,Flat", "HNSW32", "IVF1024,PQ64"]
+
+num_docs = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+num_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+
+def synthetic_corpus(n, dim, clusters=256, seed=0):
+    # 실제 문장 임베딩처럼 군집이 있는 분포를 흉내낸다
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32) * 4
+    labels = rng.integers(0, clusters, size=n)
+    return centers[labels] + rng.normal(size=(n, dim)).astype(np.float32)
+
+
+print(f"[INFO] 합성 코퍼스 생성 : 문서 {num_docs}개, 질의 {num_queries}개, {VECTOR_DIM}차원")
+corpus = synthetic_corpus(num_docs, VECTOR_DIM)
+queries = synthetic_corpus(num_queries, VECTOR_DIM, seed=1)
+ids = np.arange(num_docs, dtype=np.int64)
+
+ground_truth = None
+print(f"\n{'index':<16}{'build(s)':>10}{'recall@' + str(TOP_K):>11}{'p50(ms)':>10}{'p95(ms)':>10}{'memory(MB)':>12}")
+for spec in SPECS:
+    index = make_index(VECTOR_DIM, spec)
+    if num_docs < min_train_size(index):
+        print(f"{spec:<16} 문서 수가 학습에 필요한 {min_train_size(index)}개보다 적어 생략")
+        continue
+
+    start = time.time()
+    if not index.is_trained:
+        index.train(corpus)
+    index.add_with_ids(corpus, ids)
+    build_time = time.time() - start
+    configure_search(index)
+
+    latencies = []
+    results = []
+    for q in queries:
+        start = time.time()
+        _, I = index.search(q.reshape(1, -1), TOP_K)
+        latencies.append(time.time() - start)
+        results.append(I[0])
+    results = np.stack(results)
+
+    if ground_truth is None:
+        ground_truth = results  # 첫 번째(Flat)가 정답
+    recall = np.mean([len(set(r) & set(g)) / TOP_K for r, g in zip(results, ground_truth)])
+
+    latencies.sort()
+    memory = len(faiss.serialize_index(index)) / (1024 * 1024)
+    print(f"{spec:<16}{build_time:>10.2f}{recall:>11.3f}{latencies[len(latencies) // 2] * 1000:>10.2f}"
+          f"{latencies[int(len(latencies) * 0.95) - 1] * 1000:>10.2f}{memory:>12.1f}")
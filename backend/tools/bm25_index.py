@@ -0,0 +1,115 @@
+# bm25_index.py
+# 빌드(embed_documents.py)와 검색(query_rag.py)이 같이 쓰는 BM25 키워드 인덱스
+# 전화번호 / 이메일 / 주소처럼 글자가 그대로 맞아야 하는 질문은 임베딩 유사도가 불안정하므로
+# 한국어 글자 n-gram 역색인으로 보완한다. 문서 id 는 FAISS 인덱스와 같은 passage id
+# 두 검색 결과는 fuse_rankings(RRF) 로 합친다
+
+import os
+import re
+import unicodedata
+
+import numpy as np
+
+# ===== 설정 =====
+BM25_K1 = 1.2
+BM25_B = 0.75
+NGRAM_SIZE = 2   # 한 단어 안의 글자 n-gram (한국어는 띄어쓰기/조사 변형이 많아 형태소 대신 사용)
+RRF_K = 60       # reciprocal rank fusion 상수
+
+
+def bm25_path(index_path):
+    return index_path + ".bm25.npz"
+
+
+def tokenize(text):
+    # 단어(\w+) 전체 + 단어 안의 글자 n-gram. 숫자/영문 토큰(전화번호 조각, 이메일 아이디)도 그대로 남는다
+    text = unicodedata.normalize("NFC", text).lower()
+    terms = []
+    for word in re.findall(r"\w+", text):
+        terms.append(word)
+        if len(word) > NGRAM_SIZE:
+            terms.extend(word[i:i + NGRAM_SIZE] for i in range(len(word) - NGRAM_SIZE + 1))
+    return terms
+
+
+def build_bm25(passages, path):
+    # passages : (passage id, 본문) 목록. 용어별 (문서 위치, tf) 를 CSR 형태 배열로 저장
+    ids, lengths = [], []
+    postings = {}
+    for pos, (doc_id, text) in enumerate(passages):
+        terms = tokenize(text)
+        ids.append(doc_id)
+        lengths.append(len(terms))
+        counts = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        for term, tf in counts.items():
+            postings.setdefault(term, []).append((pos, tf))
+
+    terms = sorted(postings)
+    starts = np.zeros(len(terms) + 1, dtype=np.int64)
+    docs, tfs = [], []
+    for n, term in enumerate(terms):
+        for pos, tf in postings[term]:
+            docs.append(pos)
+            tfs.append(tf)
+        starts[n + 1] = len(docs)
+
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"  # np.savez 는 확장자가 없으면 .npz 를 붙인다
+    np.savez(tmp_path,
+             terms=np.array(terms, dtype=np.str_),
+             starts=starts,
+             docs=np.array(docs, dtype=np.int64),
+             tfs=np.array(tfs, dtype=np.float32),
+             ids=np.array(ids, dtype=np.int64),
+             lengths=np.array(lengths, dtype=np.float32))
+    os.replace(tmp_path, path)
+    return len(ids), len(terms)
+
+
+class BM25Index:
+    def __init__(self, path):
+        with np.load(path) as data:
+            self.starts = data["starts"]
+            self.docs = data["docs"]
+            self.tfs = data["tfs"]
+            self.ids = data["ids"]
+            self.lengths = data["lengths"]
+            self.term_index = {term: n for n, term in enumerate(data["terms"].tolist())}
+        self.avgdl = float(self.lengths.mean()) if len(self.lengths) else 0.0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, query, top_k):
+        # (점수 배열, passage id 배열) 을 점수 내림차순으로 반환. 겹치는 용어가 없으면 빈 배열
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        matched = False
+        for term in set(tokenize(query)):
+            n = self.term_index.get(term)
+            if n is None:
+                continue
+            matched = True
+            docs = self.docs[self.starts[n]:self.starts[n + 1]]
+            tfs = self.tfs[self.starts[n]:self.starts[n + 1]]
+            idf = np.log(1 + (len(self.ids) - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[docs] / self.avgdl)
+            scores[docs] += idf * tfs * (BM25_K1 + 1) / (tfs + norm)
+        if not matched:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+
+        top_k = min(top_k, len(scores))
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        top = top[scores[top] > 0]
+        return scores[top], self.ids[top]
+
+
+def fuse_rankings(rankings, top_k, k=RRF_K):
+    # reciprocal rank fusion : 점수 척도가 다른 (L2 거리, BM25) 목록을 순위만으로 합친다
+    # 점수가 같으면 먼저 나온 목록의 순서를 따르므로, 목록이 하나면 그 순서 그대로
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return tuple(sorted(scores, key=scores.get, reverse=True)[:top_k])
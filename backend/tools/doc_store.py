@@ -0,0 +1,100 @@
+# doc_store.py
+# RAG 문서(JSONL)를 통째로 파싱해서 들고 있지 않고, 줄 오프셋 인덱스 + mmap 으로 필요한 줄만 읽는다
+# mmap 페이지는 OS 페이지 캐시를 공유하므로 워커가 여러 개여도 문서는 메모리에 한 벌만 올라간다
+# 서버가 도는 중에 JSONL 을 고칠 때는 임시 파일에 쓰고 os.replace 로 바꿔야 한다 (원자적 교체)
+#  - 교체하면 열어 둔 예전 파일(inode)은 그대로 남으므로 예전 스냅샷도 끝까지 올바르게 읽힌다
+#  - 제자리에서 덮어쓰면(truncate 후 쓰기) 오프셋이 어긋나고, 파일이 짧아지면 mmap 접근이 SIGBUS 로 죽는다
+#    이 경우를 감지하면 mmap 을 건드리지 않고 파일을 직접 읽는다 (새 스냅샷으로 교체될 때까지의 임시 경로)
+
+import json
+import mmap
+import os
+
+import numpy as np
+
+
+def offsets_path(path):
+    return path + ".offsets.npy"
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def build_offsets(path):
+    # 0 번 행은 원본 파일의 (size, mtime_ns), 이후 행은 줄마다 (시작, 끝) 바이트 오프셋
+    rows = [_signature(path)]
+    pos = 0
+    with open(path, "rb") as f:
+        for line in f:
+            rows.append((pos, pos + len(line)))
+            pos += len(line)
+    offsets = np.array(rows, dtype=np.int64)
+
+    tmp_path = f"{offsets_path(path)}.{os.getpid()}.tmp"  # 여러 워커가 동시에 만들어도 겹치지 않도록
+    try:
+        with open(tmp_path, "wb") as f:
+            np.save(f, offsets)
+        os.replace(tmp_path, offsets_path(path))
+    except OSError as e:
+        print(f"[WARN] 오프셋 인덱스 저장 실패, 메모리에서만 사용 : {e}")
+    return offsets[1:]
+
+
+def load_offsets(path):
+    # 오프셋 파일이 원본과 맞으면 mmap 으로 열고, 아니면 새로 만든다
+    if os.path.exists(offsets_path(path)):
+        offsets = np.load(offsets_path(path), mmap_mode="r")
+        if len(offsets) and tuple(offsets[0]) == _signature(path):
+            return offsets[1:]
+    return build_offsets(path)
+
+
+class DocStore:
+    def __init__(self, path):
+        self.path = path
+        self.offsets = load_offsets(path)
+        self.file = open(path, "rb")
+        stat = os.fstat(self.file.fileno())
+        self.signature = (stat.st_size, stat.st_mtime_ns)  # 오프셋을 믿을 수 있는 파일 상태
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else b""
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def is_stale(self):
+        # 열어 둔 파일이 제자리에서 덮어써졌는지. 원자적 교체는 열어 둔 inode 를 바꾸지 않으므로 해당 없음
+        stat = os.fstat(self.file.fileno())
+        return (stat.st_size, stat.st_mtime_ns) != self.signature
+
+    def get(self, line_no):
+        # 줄 번호의 문서(dict). 빈 줄이면 None
+        if self.is_stale():
+            return self._read_stale(line_no)
+        start, end = self.offsets[line_no]
+        raw = self.data[int(start):int(end)].strip()
+        return json.loads(raw) if raw else None
+
+    def _read_stale(self, line_no):
+        # 오프셋이 어긋났으므로 처음부터 줄을 세어 읽는다. 없는 줄이나 쓰는 중인 줄은 None
+        with open(self.path, "rb") as f:
+            for n, line in enumerate(f):
+                if n == line_no:
+                    break
+            else:
+                return None
+        raw = line.strip()
+        try:
+            return json.loads(raw) if raw else None
+        except ValueError:
+            return None
+
+    def text(self, line_no):
+        doc = self.get(line_no)
+        return doc['text'] if doc else ""
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
@@ -1,46 +1,328 @@
 # embed_documents.py
+# rag_documents.jsonl → FAISS 인덱스 (스트리밍 증분 빌드)
+#  - 문서마다 안정적인 키(id 필드, 없으면 본문 해시)와 본문 해시를 매니페스트에 기록
+#  - 새 문서 / 바뀐 문서만 다시 임베딩하고, 지워진 문서는 인덱스에서 제거
+#  - JSONL 은 한 번에 다 읽지 않고 READ_CHUNK_DOCS 개씩 처리, 긴 문서는 겹치는 passage 로 나눈다
+#  - 인덱스는 IndexIDMap 이라 FAISS 검색 결과 I 는 매니페스트의 passage id
+#  - CHECKPOINT_DOCS 개마다 인덱스/매니페스트를 저장하므로 중간에 끊겨도 다시 실행하면 이어서 진행
+#  - 인덱스 종류는 rag_index.INDEX_FACTORY (RAG_INDEX_FACTORY 환경변수) 로 정한다
+#  - 같은 passage 로 BM25 키워드 인덱스(bm25_index.py)도 함께 만든다 (하이브리드 검색용)
+# 사용법 : python tools/embed_documents.py [--full] [--batch-size N] [--no-fp16] [--normalize]
 
 import json
 import faiss
 from sentence_transformers import SentenceTransformer
+import numpy as np
+import argparse
+import hashlib
 import os
+import sys
+import time
+
+import torch
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from tools.bm25_index import bm25_path, build_bm25
+from tools.doc_store import build_offsets
+from tools.rag_index import INDEX_FACTORY, make_index, min_train_size, supports_remove
 
 # ===== 설정 =====
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 JSONL_PATH = os.path.join(CURRENT_DIR, "../data/rag_documents.jsonl")  # JSONL 파일 경로
 FAISS_INDEX_PATH = os.path.join(CURRENT_DIR, "../embeddings/faiss_index.index") # 저장할 FAISS 인덱스 경로
+MANIFEST_PATH = FAISS_INDEX_PATH + ".manifest.json"  # 인덱싱된 문서 목록 (사이드카)
 # EMBEDDING_MODEL_NAME = "jhgan/ko-sroberta-multitask"  # 한국어 특화 임베딩 모델 사용
 EMBEDDING_MODEL_NAME = "jhgan/ko-sroberta-multitask"  # 한국어 특화 임베딩 모델 사용
 VECTOR_DIM = 768  # ko-sroberta-multitask 모델 출력 차원
 
-# ===== 디렉토리 생성 =====
-os.makedirs(os.path.dirname(FAISS_INDEX_PATH), exist_ok=True)
+READ_CHUNK_DOCS = 1000      # 한 번에 임베딩할 문서 수
+CHECKPOINT_DOCS = 10000     # 이만큼 처리할 때마다 중간 저장
+EMBED_BATCH_SIZE = 64       # model.encode 배치 크기
+EMBED_FP16 = True           # GPU 가 있을 때만 적용
+EMBED_NORMALIZE = False     # True 면 단위 벡터로 저장 (검색 쪽도 매니페스트를 보고 같이 정규화)
+PASSAGE_MAX_CHARS = 500     # passage 최대 길이 (글자)
+PASSAGE_OVERLAP = 100       # passage 사이 겹치는 글자 수
+
+
+class FullRebuildRequired(Exception):
+    pass
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def iter_documents(path=JSONL_PATH, stats=None, warn=True):
+    # (문서 키, 본문, 줄 번호) 를 한 줄씩 넘긴다. id 필드가 없으면 본문 해시를 키로 쓰고, 같은 본문이 반복되면 #n 을 붙인다
+    # 깨진 줄은 건너뛰고 stats['skipped'] 에 센다
+    seen = set()
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f):
+            if not line.strip():
+                continue
+            try:
+                obj = json.loads(line)
+                text = obj["text"]
+                if not isinstance(text, str):
+                    raise ValueError("text 가 문자열이 아님")
+            except (ValueError, KeyError, TypeError) as e:
+                if warn:
+                    print(f"[WARN] {line_no + 1}번째 줄 건너뜀 : {e}")
+                if stats is not None:
+                    stats["skipped"] += 1
+                continue
+
+            key = str(obj["id"]) if obj.get("id") is not None else content_hash(text)[:16]
+            base_key, n = key, 1
+            while key in seen:
+                key = f"{base_key}#{n}"
+                n += 1
+            seen.add(key)
+            yield key, text, line_no
+
+
+def read_documents(path=JSONL_PATH):
+    return list(iter_documents(path))
+
+
+def split_passages(text, max_chars=PASSAGE_MAX_CHARS, overlap=PASSAGE_OVERLAP):
+    # 본문 안의 (시작, 끝) 글자 위치 목록. 짧은 문서는 통째로 하나
+    if len(text) <= max_chars:
+        return [(0, len(text))]
+    step = max(max_chars - overlap, 1)
+    spans = []
+    for start in range(0, len(text), step):
+        end = min(start + max_chars, len(text))
+        spans.append((start, end))
+        if end == len(text):
+            break
+    return spans
+
+
+def empty_manifest(index_factory=INDEX_FACTORY, normalize=EMBED_NORMALIZE):
+    # requested_factory : 설정값, index_factory : 실제로 만든 종류 (문서가 적으면 Flat 으로 대체될 수 있다)
+    return {"model": EMBEDDING_MODEL_NAME, "dim": VECTOR_DIM, "requested_factory": index_factory,
+            "index_factory": index_factory, "normalize": normalize, "complete": False,
+            "next_id": 0, "documents": {}}
+
+
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def save_index(index, path=FAISS_INDEX_PATH):
+    # 쓰는 도중에 서버가 읽지 않도록 임시 파일에 쓰고 교체
+    tmp_path = path + ".tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def entry_ids(entry):
+    # 매니페스트 항목의 passage id 목록 (passage 도입 전 항목은 id 하나)
+    if "passages" in entry:
+        return [passage[0] for passage in entry["passages"]]
+    return [entry["id"]]
+
+
+def save_bm25(manifest):
+    # BM25 는 임베딩보다 훨씬 싸므로 증분 없이 매번 전체 passage 로 다시 만든다
+    indexed = manifest["documents"]
+    passages = []
+    for key, text, _ in iter_documents(JSONL_PATH, warn=False):
+        entry = indexed.get(key)
+        if entry is not None:
+            spans = entry.get("passages") or [[entry["id"], 0, len(text)]]  # passage 도입 전 항목은 문서 전체
+            passages.extend((doc_id, text[start:end]) for doc_id, start, end in spans)
+    count, terms = build_bm25(passages, bm25_path(FAISS_INDEX_PATH))
+    print(f"[INFO] BM25 인덱스 저장 완료 : passage {count}개, 용어 {terms}개")
+
+
+class IndexWriter:
+    # IVF / PQ 처럼 학습이 필요한 인덱스는 학습에 충분한 벡터가 모일 때까지 버퍼에 모았다가 한 번에 학습 후 추가
+    def __init__(self, index, manifest):
+        self.index = index
+        self.manifest = manifest
+        self.buffer_vecs = []
+        self.buffer_ids = []
+
+    def add(self, vecs, ids):
+        if self.index.is_trained:
+            self.index.add_with_ids(vecs, ids)
+            return
+        self.buffer_vecs.append(vecs)
+        self.buffer_ids.append(ids)
+        if sum(len(v) for v in self.buffer_vecs) >= min_train_size(self.index) * 39:  # faiss 권장 학습량
+            self._train_and_flush()
+
+    def remove(self, ids):
+        if not ids:
+            return
+        if not supports_remove(self.index):
+            raise FullRebuildRequired()
+        self.index.remove_ids(np.array(ids, dtype=np.int64))
+
+    def _train_and_flush(self):
+        vecs = np.concatenate(self.buffer_vecs)
+        ids = np.concatenate(self.buffer_ids)
+        if not self.index.is_trained:
+            if len(vecs) < min_train_size(self.index):
+                print(f"[WARN] 벡터 {len(vecs)}개로는 {INDEX_FACTORY} 학습 불가, Flat 인덱스로 빌드")
+                self.index = make_index(VECTOR_DIM, "Flat")
+                self.manifest["index_factory"] = "Flat"
+            else:
+                print(f"[INFO] {INDEX_FACTORY} 인덱스 학습 중... (벡터 {len(vecs)}개)")
+                self.index.train(vecs)
+        self.index.add_with_ids(vecs, ids)
+        self.buffer_vecs, self.buffer_ids = [], []
+
+    def finish(self):
+        if self.buffer_vecs:
+            self._train_and_flush()
+        return self.index
+
+
+def load_embedding_model(fp16=EMBED_FP16):
+    print("[INFO] 한국어 임베딩 모델 로드 중...")
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    if fp16 and torch.cuda.is_available():
+        model = model.half()
+    return model
+
+
+def build_index(full=False, model=None, batch_size=EMBED_BATCH_SIZE, fp16=EMBED_FP16, normalize=EMBED_NORMALIZE):
+    os.makedirs(os.path.dirname(FAISS_INDEX_PATH), exist_ok=True)
+
+    manifest = None if full else load_manifest()
+    if manifest is not None and (manifest.get("model") != EMBEDDING_MODEL_NAME
+                                 or manifest.get("requested_factory", "Flat") != INDEX_FACTORY
+                                 or manifest.get("normalize", False) != normalize
+                                 or not os.path.exists(FAISS_INDEX_PATH)):
+        print("[INFO] 임베딩 모델/인덱스 종류/정규화 설정이 바뀌었거나 인덱스가 없어 전체 재빌드")
+        manifest = None
+
+    if manifest is not None:
+        index = faiss.read_index(FAISS_INDEX_PATH)
+        if index.ntotal != sum(len(entry_ids(entry)) for entry in manifest["documents"].values()):
+            print("[INFO] 인덱스와 매니페스트가 맞지 않아 전체 재빌드")
+            manifest = None
+        elif not manifest.get("complete", True):
+            print("[INFO] 이전 빌드가 중간에 끊겨 이어서 진행")
+    if manifest is None:
+        manifest = empty_manifest(normalize=normalize)
+        index = make_index(VECTOR_DIM)
+
+    # 인덱스 / BM25 파일을 하나라도 쓰기 전에 빌드 중임을 알린다
+    # (검색 서버의 감시 스레드가 새 인덱스를 예전 매니페스트와 짝지어 로딩하지 않도록)
+    manifest["complete"] = False
+    save_manifest(manifest)
+
+    writer = IndexWriter(index, manifest)
+    indexed = manifest["documents"]
+    stats = {"added": 0, "passages": 0, "unchanged": 0, "skipped": 0, "removed": 0}
+
+    def embed_chunk(chunk):
+        nonlocal model
+        if model is None:
+            model = load_embedding_model(fp16)
+
+        # 바뀐 문서는 기존 passage 를 먼저 지운다
+        writer.remove([i for key, _, _ in chunk if key in indexed for i in entry_ids(indexed[key])])
+
+        passages = []
+        for key, text, line_no in chunk:
+            spans = split_passages(text)
+            entry = {"hash": content_hash(text), "line": line_no, "passages": []}
+            for start, end in spans:
+                doc_id = manifest["next_id"]
+                manifest["next_id"] += 1
+                entry["passages"].append([doc_id, start, end])
+                passages.append((doc_id, text[start:end]))
+            indexed[key] = entry
+
+        embeddings = model.encode([text for _, text in passages], batch_size=batch_size,
+                                  normalize_embeddings=normalize, convert_to_numpy=True)
+        writer.add(np.asarray(embeddings, dtype=np.float32), np.array([i for i, _ in passages], dtype=np.int64))
+        stats["added"] += len(chunk)
+        stats["passages"] += len(passages)
+
+    def checkpoint():
+        # 학습 대기 중인 벡터가 있으면 아직 인덱스에 안 들어갔으므로 저장하지 않는다
+        if writer.buffer_vecs:
+            return
+        save_index(writer.index)
+        save_manifest(manifest)
+        print(f"[INFO] 중간 저장 : 문서 {stats['added']}개 처리")
+
+    # ===== JSONL 스트리밍 처리 =====
+    print(f"[INFO] JSONL 문서 처리 중: {JSONL_PATH}")
+    start = time.time()
+    current_keys = set()
+    chunk = []
+    since_checkpoint = 0
+    try:
+        for key, text, line_no in iter_documents(JSONL_PATH, stats):
+            current_keys.add(key)
+            entry = indexed.get(key)
+            if entry is not None and entry["hash"] == content_hash(text):
+                entry["line"] = line_no
+                stats["unchanged"] += 1
+                continue
+
+            chunk.append((key, text, line_no))
+            if len(chunk) >= READ_CHUNK_DOCS:
+                embed_chunk(chunk)
+                since_checkpoint += len(chunk)
+                chunk = []
+                elapsed = time.time() - start
+                print(f"[INFO] 문서 {stats['added']}개 임베딩 ({stats['added'] / elapsed:.1f} docs/sec)")
+                if since_checkpoint >= CHECKPOINT_DOCS:
+                    checkpoint()
+                    since_checkpoint = 0
+        if chunk:
+            embed_chunk(chunk)
 
-# ===== 모델 로드 =====
-print("[INFO] 한국어 임베딩 모델 로드 중...")
-model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+        # ===== 지워진 문서 제거 =====
+        stale = [key for key in indexed if key not in current_keys]
+        writer.remove([i for key in stale for i in entry_ids(indexed[key])])
+    except FullRebuildRequired:
+        print("[INFO] 이 인덱스 종류는 삭제를 지원하지 않아 전체 재빌드")
+        return build_index(full=True, model=model, batch_size=batch_size, fp16=fp16, normalize=normalize)
 
-# ===== JSONL 파일 로드 =====
-print(f"[INFO] JSONL 문서 로딩 중: {JSONL_PATH}")
-texts = []
-ids = []
+    for key in stale:
+        del indexed[key]
+    stats["removed"] = len(stale)
 
-with open(JSONL_PATH, "r", encoding="utf-8") as f:
-    for line in f:
-        obj = json.loads(line)
-        texts.append(obj["text"])
-        ids.append(obj.get("id", None))
+    index = writer.finish()
+    save_index(index)
+    save_bm25(manifest)
+    manifest["complete"] = True
+    save_manifest(manifest)
+    build_offsets(JSONL_PATH)  # 검색 쪽 DocStore 가 바로 mmap 으로 열 수 있도록 오프셋 인덱스도 갱신
 
-print(f"[INFO] 총 {len(texts)}개 문서 로딩 완료")
+    elapsed = time.time() - start
+    print(f"[INFO] 추가/갱신 {stats['added']}개 (passage {stats['passages']}개), 삭제 {stats['removed']}개, "
+          f"유지 {stats['unchanged']}개, 건너뜀 {stats['skipped']}개")
+    print(f"[INFO] 소요 {elapsed:.2f}초, {stats['added'] / elapsed if elapsed else 0:.1f} docs/sec")
+    print(f"[INFO] FAISS 인덱스 저장 완료 → {FAISS_INDEX_PATH}")
+    return index, manifest
 
-# ===== 임베딩 수행 =====
-print("[INFO] 문서 임베딩 중...")
-embeddings = model.encode(texts, show_progress_bar=True)
 
-# ===== FAISS 인덱스 생성 및 저장 =====
-print("[INFO] FAISS 인덱스 생성 중...")
-index = faiss.IndexFlatL2(VECTOR_DIM)
-index.add(embeddings)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RAG 문서 FAISS 인덱스 빌드")
+    parser.add_argument("--full", action="store_true", help="매니페스트를 무시하고 전체 재빌드")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--no-fp16", action="store_true", help="GPU 에서도 fp32 로 임베딩")
+    parser.add_argument("--normalize", action="store_true", default=EMBED_NORMALIZE, help="단위 벡터로 저장")
+    args = parser.parse_args()
 
-faiss.write_index(index, FAISS_INDEX_PATH)
-print(f"[INFO] FAISS 인덱스 저장 완료 → {FAISS_INDEX_PATH}")
\ No newline at end of file
+    build_index(full=args.full, batch_size=args.batch_size, fp16=not args.no_fp16, normalize=args.normalize)
@@ -5,42 +5,302 @@ import faiss
 from sentence_transformers import SentenceTransformer
 import numpy as np
 import os
+import re
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
 from typing import Union
 
+from tools.bm25_index import BM25Index, bm25_path, fuse_rankings
+from tools.doc_store import DocStore
+from tools.rag_prompt import build_prompt
+from tools.rag_index import configure_search
+from tools.rerank import RERANK_CANDIDATES, get_reranker
+
 
 # ===== 설정 =====
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 
-JSONL_PATH = os.path.join(CURRENT_DIR, "../data/rag_documents.jsonl")
+JSONL_PATH = os.path.join(CURRENT_DIR, "../data/rag_documents.jsonl")  # 서버 실행 중 수정은 os.replace 로 통째 교체 (doc_store.py 참고)
 FAISS_INDEX_PATH = os.path.join(CURRENT_DIR, "../embeddings/faiss_index.index")
+MANIFEST_PATH = FAISS_INDEX_PATH + ".manifest.json"  # embed_documents.py 가 쓰는 문서 id 매니페스트
+BM25_PATH = bm25_path(FAISS_INDEX_PATH)
 EMBEDDING_MODEL_NAME = "jhgan/ko-sroberta-multitask"
 VECTOR_DIM = 768
 TOP_K = 3
+QUERY_CACHE_SIZE = 1024     # 캐시할 질문 수 (LRU)
+QUERY_CACHE_TTL = 60 * 60   # 초
+INDEX_POLL_INTERVAL = 5     # 인덱스 파일 변경 확인 주기 (초)
+HYBRID_SEARCH = os.environ.get("RAG_HYBRID_SEARCH", "1") != "0"  # BM25 키워드 검색 결과도 같이 사용
+BM25_MIN_SCORE = float(os.environ.get("RAG_BM25_MIN_SCORE", 5.0))  # 이 점수 이상이어야 키워드 검색 결과를 문맥으로 인정
 
 # ===== 전역 로드 =====
 model = SentenceTransformer(EMBEDDING_MODEL_NAME)
-index = faiss.read_index(FAISS_INDEX_PATH)
-with open(JSONL_PATH, "r", encoding="utf-8") as f:
-    documents = [json.loads(line) for line in f]
 
-def get_rag_prompt(question: str, top_k: int = TOP_K, threshold: float = 1) -> Union[str, None]:
-    query_vec = model.encode([question]) # 질문을 벡터 인코딩화 한다.
-    D, I = index.search(query_vec, top_k) # RAG 문서에서 질문과 유사한 것을 찾는다.
 
-    # 유사도가 너무 낮으면 RAG 생략
+# ===== 버전 관리되는 인덱스 저장소 (서버 재시작 없이 교체) =====
+def _files_signature():
+    # 인덱스 / 매니페스트 / BM25 파일의 (mtime, size). 하나라도 바뀌면 새 버전
+    # 문서 파일(JSONL)은 보지 않는다. 고친 JSONL 만 보고 교체하면 예전 매니페스트의 줄 번호로 새 파일을 읽게 되므로
+    # embed_documents.py 가 그 JSONL 로 인덱스와 매니페스트를 다시 쓴 뒤에 함께 교체한다
+    signature = []
+    for path in (FAISS_INDEX_PATH, MANIFEST_PATH, BM25_PATH):
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def _read_index_mmap(path):
+    # 인덱스 데이터도 mmap 으로 열어서 워커끼리 페이지 캐시를 공유한다. 지원하지 않는 종류면 일반 로딩
+    for flag_name in ("IO_FLAG_MMAP_IFC", "IO_FLAG_MMAP"):
+        flag = getattr(faiss, flag_name, None)
+        if flag is None:
+            continue
+        try:
+            return faiss.read_index(path, flag | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            continue
+    return faiss.read_index(path)
+
+
+class IndexSnapshot:
+    # 한 시점의 인덱스 + 문서. 요청 하나는 처음 잡은 스냅샷만 사용한다
+    def __init__(self):
+        self.signature = _files_signature()
+        self.loaded_at = time.time()
+        self.index = configure_search(_read_index_mmap(FAISS_INDEX_PATH))
+        self.documents = DocStore(JSONL_PATH)  # 검색된 k 개 문서만 그때그때 읽는다
+        manifest = load_manifest()
+        self.normalize = manifest.get("normalize", False)  # 인덱스가 단위 벡터로 만들어졌으면 질문도 정규화
+        self.passages = self._load_passages(manifest)
+        self.bm25 = BM25Index(BM25_PATH) if os.path.exists(BM25_PATH) else None  # 예전 빌드에는 없다
+
+    def _load_passages(self, manifest):
+        # passage id → (JSONL 줄 번호, 시작, 끝). 매니페스트가 없는 예전 인덱스(IndexFlatL2)는 id 가 곧 줄 번호
+        passages = {}
+        for entry in manifest.get("documents", {}).values():
+            if "passages" in entry:
+                for doc_id, start, end in entry["passages"]:
+                    passages[doc_id] = (entry["line"], start, end)
+            else:
+                passages[entry["id"]] = (entry["line"], None, None)
+        return passages
+
+    def document_text(self, doc_id: int) -> str:
+        line, start, end = self.passages.get(doc_id, (doc_id, None, None))
+        return self.documents.text(line)[start:end]
+
+
+def load_manifest():
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+    with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+class IndexStore:
+    # 백그라운드에서 파일 변경을 감시하다가 새 스냅샷을 다 읽은 뒤에 참조만 바꿔 끼운다
+    def __init__(self, poll_interval=INDEX_POLL_INTERVAL):
+        self.snapshot = IndexSnapshot()
+        self.poll_interval = poll_interval
+        self.pending_signature = None
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._watch, name="rag-index-watch", daemon=True)
+        self.thread.start()
+
+    def current(self) -> IndexSnapshot:
+        return self.snapshot
+
+    def reload_if_changed(self) -> bool:
+        with self.lock:
+            signature = _files_signature()
+            if signature == self.snapshot.signature:
+                self.pending_signature = None
+                return False
+            # 빌드 도중(인덱스만 쓰고 매니페스트는 아직)일 수 있으므로 한 주기 동안 그대로인지 확인 후 로딩
+            if signature != self.pending_signature:
+                self.pending_signature = signature
+                return False
+            # 중간 저장된(아직 빌드 중인) 인덱스는 건너뛰고 완료된 뒤에 교체
+            if not load_manifest().get("complete", True):
+                return False
+
+            snapshot = IndexSnapshot()
+            self.snapshot = snapshot
+            self.pending_signature = None
+            print(f"[INFO] RAG 인덱스 교체 완료 : 벡터 {snapshot.index.ntotal}개, 문서 {len(snapshot.documents)}줄")
+            return True
+
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.reload_if_changed()
+            except Exception as e:
+                print(f"[WARN] RAG 인덱스 재로딩 실패, 기존 인덱스 유지 : {e}")
+
+
+index_store = IndexStore()
+
+
+def get_index_info():
+    snapshot = index_store.current()
+    return {
+        'vectors': snapshot.index.ntotal,
+        'documents': len(snapshot.documents),
+        'loaded_at': snapshot.loaded_at,
+    }
+
+
+# ===== 질문 임베딩 / 검색 결과 캐시 =====
+def normalize_question(question: str) -> str:
+    question = unicodedata.normalize("NFC", question)
+    return re.sub(r"\s+", " ", question).strip().lower()
+
+
+class QueryCache:
+    # 정규화된 질문 → (임베딩, {(인덱스 스냅샷 시그니처, top_k): (D, I)})
+    # 임베딩은 인덱스와 무관하므로 유지하고, 검색 결과만 인덱스가 바뀌면 버린다
+    def __init__(self, maxsize=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'embedding_hits': 0, 'embedding_misses': 0, 'search_hits': 0, 'search_misses': 0}
+
+    def _entry(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry['created_at'] > self.ttl:
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def get_embedding(self, key):
+        with self.lock:
+            entry = self._entry(key)
+            self.stats['embedding_hits' if entry else 'embedding_misses'] += 1
+            return entry['vec'] if entry else None
+
+    def put_embedding(self, key, vec):
+        with self.lock:
+            self.entries[key] = {'vec': vec, 'searches': {}, 'created_at': time.time()}
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def get_search(self, key, signature, top_k):
+        with self.lock:
+            entry = self._entry(key)
+            result = entry['searches'].get((signature, top_k)) if entry else None
+            self.stats['search_hits' if result is not None else 'search_misses'] += 1
+            return result
+
+    def put_search(self, key, signature, top_k, result):
+        with self.lock:
+            entry = self._entry(key)
+            if entry is not None:
+                # 이전 인덱스 기준 결과는 더 이상 쓰지 않으므로 정리
+                entry['searches'] = {k: v for k, v in entry['searches'].items() if k[0] == signature}
+                entry['searches'][(signature, top_k)] = result
+
+    def get_stats(self):
+        with self.lock:
+            return {**self.stats, 'size': len(self.entries), 'maxsize': self.maxsize}
+
+
+query_cache = QueryCache()
+
+
+def get_cache_stats():
+    reranker = get_reranker()
+    return {**query_cache.get_stats(), 'rerank': reranker.get_stats() if reranker else None}
+
+
+def search(question: str, top_k: int = TOP_K, snapshot: IndexSnapshot = None, timing: dict = None):
+    # 질문 임베딩 + FAISS 검색. 같은 질문이 반복되면 임베딩 모델과 검색을 건너뛴다
+    # (질문 임베딩, D, I) 반환. timing 을 주면 'embedding', 'faiss_search' 소요 시간(초)을 채운다
+    # 캐시 적중으로 건너뛴 단계는 넣지 않는다 (0 으로 넣으면 지연 히스토그램이 실제보다 빠르게 보인다)
+    snapshot = snapshot or index_store.current()
+    key = normalize_question(question)
+    signature = snapshot.signature
+    timing = {} if timing is None else timing
+
+    query_vec = query_cache.get_embedding(key)
+    if query_vec is None:
+        start = time.time()
+        query_vec = model.encode([question]) # 질문을 벡터 인코딩화 한다.
+        timing['embedding'] = time.time() - start
+        query_cache.put_embedding(key, query_vec)
+
+    cached = query_cache.get_search(key, signature, top_k)
+    if cached is not None:
+        return (query_vec, *cached)
+
+    start = time.time()
+    search_vec = query_vec
+    if snapshot.normalize:
+        search_vec = query_vec / np.linalg.norm(query_vec, axis=1, keepdims=True)
+    D, I = snapshot.index.search(search_vec, top_k) # RAG 문서에서 질문과 유사한 것을 찾는다.
+    timing['faiss_search'] = time.time() - start
+    query_cache.put_search(key, signature, top_k, (D, I))
+    return query_vec, D, I
+
+
+def keyword_search(question: str, top_k: int = TOP_K, snapshot: IndexSnapshot = None):
+    # BM25 (점수, passage id) 반환. 키워드 인덱스가 없거나 꺼져 있으면 빈 결과
+    snapshot = snapshot or index_store.current()
+    if not HYBRID_SEARCH or snapshot.bm25 is None:
+        return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+    return snapshot.bm25.search(question, top_k)
+
+
+def get_rag_context(question: str, top_k: int = TOP_K, threshold: float = 1, count_tokens=None, token_budget=None):
+    # (프롬프트, {'query_vec', 'doc_ids', 'prefix', 'top_score', 'bm25_score', 'index_version', 'timing'}) 반환. RAG 를 생략하면 doc_ids 는 빈 튜플
+    # rerank 가 켜져 있으면 후보를 RERANK_CANDIDATES 개 뽑아서 cross-encoder 점수로 다시 고른다
+    # count_tokens + token_budget 을 주면 프롬프트 전체가 예산 안에 들어가도록 문맥 passage 를 줄인다
+    snapshot = index_store.current()
+    reranker = get_reranker()
+    candidate_k = max(top_k, RERANK_CANDIDATES) if reranker else top_k
+    timing = {}
+    query_vec, D, I = search(question, candidate_k, snapshot, timing)
+    bm25_scores, bm25_ids = keyword_search(question, candidate_k, snapshot)
+
+    # 유사도가 너무 낮은 쪽 결과는 버리고, 둘 다 낮으면 RAG 생략 (점수는 호출한 쪽에서 rag 로 기록)
     top_score = D[0][0]
-    print(f"[INFO] 유사도 거리 점수: {top_score}")
-
-    if top_score > threshold:  # RAG context is NOT relevant
-        # Allow model to use its fine-tuned knowledge
-        # context_block = "엔큐브와 관련된 질문이 아니면 '죄송합니다' 라고 대답하세요.\n" # No RAG context provided
-        context_block = "" # No RAG context provided
-        instruction_suffix = "" # No strict instruction to say "모르겠습니다"
-    else : # RAG context IS relevant
-        context_data = "\n".join([documents[i]['text'] for i in I[0]])
-        context_block = f"다음 정보를 참고하여 질문에 답하세요.\n정보:\n{context_data}\n\n"
-        # instruction_suffix = "\n정보에 없는 내용은 '모르겠습니다'라고 답변하세요."
-        instruction_suffix = "\n정보에 없는 내용은 절대로 말하지 마세요."
-
-    # Construct the final prompt
-    return f"<start_of_turn>user\n{context_block}{question}{instruction_suffix}<end_of_turn>\n<start_of_turn>model\n"
+    bm25_score = float(bm25_scores[0]) if len(bm25_scores) else 0.0
+
+    rankings = []
+    if top_score <= threshold:
+        rankings.append([int(i) for i in I[0] if i >= 0])  # 문서 수보다 top_k 가 크면 -1 이 섞여 나온다
+    if bm25_score >= BM25_MIN_SCORE:
+        rankings.append([int(i) for i in bm25_ids])
+
+    doc_ids = fuse_rankings(rankings, candidate_k)
+    if reranker is not None and doc_ids:
+        candidates = [(i, snapshot.document_text(i)) for i in doc_ids]
+        doc_ids, _ = reranker.select(normalize_question(question), snapshot.signature, question,
+                                     candidates, top_k, count_tokens=count_tokens or len)
+
+    passages = [(i, snapshot.document_text(i)) for i in doc_ids]
+    prompt, prefix, doc_ids = build_prompt(question, passages, count_tokens, token_budget)
+    return prompt, {
+        'query_vec': query_vec,
+        'doc_ids': doc_ids,
+        'prefix': prefix,
+        'top_score': float(top_score),
+        'bm25_score': bm25_score,
+        'index_version': snapshot.signature,
+        'timing': timing,
+    }
+
+
+def get_rag_prompt(question: str, top_k: int = TOP_K, threshold: float = 1) -> Union[str, None]:
+    prompt, _ = get_rag_context(question, top_k, threshold)
+    return prompt
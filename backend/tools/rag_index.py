@@ -0,0 +1,44 @@
+# rag_index.py
+# 빌드(embed_documents.py)와 검색(query_rag.py)이 같이 쓰는 FAISS 인덱스 종류 설정
+
+import os
+import faiss
+
+# ===== 설정 =====
+# faiss.index_factory 문자열 하나로 인덱스 종류를 정한다
+#  - "Flat"          : 전수 비교 (정확, 문서 수에 비례해서 느려짐)
+#  - "IVF1024,Flat"  : 클러스터 1024 개 중 RAG_IVF_NPROBE 개만 탐색
+#  - "HNSW32"        : 그래프 탐색 (문서 삭제 시 전체 재빌드)
+#  - "IVF1024,PQ64"  : IVF + 곱 양자화 (메모리 최소)
+INDEX_FACTORY = os.environ.get("RAG_INDEX_FACTORY", "Flat")
+IVF_NPROBE = int(os.environ.get("RAG_IVF_NPROBE", 16))
+HNSW_EF_SEARCH = int(os.environ.get("RAG_HNSW_EF_SEARCH", 64))
+
+
+def make_index(dim, spec=INDEX_FACTORY):
+    # 문서 id 로 추가/삭제할 수 있도록 항상 IDMap 으로 감싼다
+    return faiss.index_factory(dim, f"IDMap,{spec}", faiss.METRIC_L2)
+
+
+def _inner(index):
+    return faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+
+
+def min_train_size(index):
+    # IVF 는 클러스터 수 이상의 벡터가 있어야 학습할 수 있다
+    ivf = faiss.try_extract_index_ivf(index)
+    return ivf.nlist if ivf is not None else 0
+
+
+def supports_remove(index):
+    return not hasattr(_inner(index), "hnsw")
+
+
+def configure_search(index, nprobe=IVF_NPROBE, ef_search=HNSW_EF_SEARCH):
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = nprobe
+    inner = _inner(index)
+    if hasattr(inner, "hnsw"):
+        inner.hnsw.efSearch = ef_search
+    return index
@@ -0,0 +1,59 @@
+# rag_prompt.py
+# 검색된 passage 와 질문으로 Gemma 턴 형식 프롬프트를 조립한다 (query_rag.py 가 사용)
+
+# ===== 설정 =====
+PROMPT_HEADER = "<start_of_turn>user\n"
+PROMPT_FOOTER = "<end_of_turn>\n<start_of_turn>model\n"
+CONTEXT_INSTRUCTION = "다음 정보를 참고하여 질문에 답하세요.\n정보:\n"
+# CONTEXT_SUFFIX = "\n정보에 없는 내용은 '모르겠습니다'라고 답변하세요."
+CONTEXT_SUFFIX = "\n정보에 없는 내용은 절대로 말하지 마세요."
+
+
+def _truncate_to_budget(text, count_tokens, budget):
+    # budget 토큰 안에 들어가는 가장 긴 앞부분 (글자 단위 이분 탐색)
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(text[:mid]) <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low]
+
+
+def build_prompt(question, passages, count_tokens=None, token_budget=None):
+    # passages : 관련도 순 (passage id, 본문) 목록
+    # 토크나이저로 잘라내면 뒤쪽(질문, 턴 마커)이 잘리므로 예산을 넘으면 문맥 passage 부터 뺀다
+    # (프롬프트, KV 캐시를 재사용할 앞부분 또는 None, 실제로 넣은 passage id) 반환
+    if count_tokens is None or token_budget is None:
+        used = list(passages)
+    else:
+        fixed = count_tokens(PROMPT_HEADER + question + PROMPT_FOOTER)
+        if passages:
+            fixed += count_tokens(CONTEXT_INSTRUCTION + "\n\n" + CONTEXT_SUFFIX)
+        if fixed > token_budget:
+            # 질문만으로도 넘치면 문맥 없이 질문 앞부분만 남긴다
+            print(f"[WARN] 질문이 토큰 예산({token_budget})을 넘어 잘라냄")
+            passages = []
+            question = _truncate_to_budget(question, count_tokens,
+                                           token_budget - count_tokens(PROMPT_HEADER + PROMPT_FOOTER))
+
+        remaining = token_budget - fixed
+        used = []
+        for doc_id, text in passages:
+            tokens = count_tokens(text + "\n")
+            if tokens > remaining:
+                continue  # 더 짧은 다음 passage 는 들어갈 수 있다
+            used.append((doc_id, text))
+            remaining -= tokens
+
+    if not used:  # RAG context is NOT relevant
+        # Allow model to use its fine-tuned knowledge
+        # context_block = "엔큐브와 관련된 질문이 아니면 '죄송합니다' 라고 대답하세요.\n" # No RAG context provided
+        prefix = None
+        prompt = f"{PROMPT_HEADER}{question}{PROMPT_FOOTER}"
+    else : # RAG context IS relevant
+        context_data = "\n".join(text for _, text in used)
+        prefix = f"{PROMPT_HEADER}{CONTEXT_INSTRUCTION}{context_data}\n\n"  # 같은 문맥이면 질문만 다르다
+        prompt = f"{prefix}{question}{CONTEXT_SUFFIX}{PROMPT_FOOTER}"
+    return prompt, prefix, tuple(doc_id for doc_id, _ in used)
@@ -0,0 +1,95 @@
+# rerank.py
+# 검색(query_rag.py)에서 넉넉히 뽑은 후보 passage 를 cross-encoder 로 다시 채점해서
+# 관련 있는 것만 토큰 예산 안에서 남긴다. 프롬프트가 짧아지면 prefill 도 짧아진다
+
+import os
+import threading
+from collections import OrderedDict
+
+# ===== 설정 =====
+RERANK_ENABLED = os.environ.get("RAG_RERANK", "0") == "1"
+RERANK_MODEL_NAME = os.environ.get("RAG_RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")  # 다국어(한국어 포함) 소형 모델
+RERANK_CANDIDATES = int(os.environ.get("RAG_RERANK_CANDIDATES", 16))  # 검색 단계에서 뽑을 후보 수
+RERANK_MIN_SCORE = float(os.environ.get("RAG_RERANK_MIN_SCORE", 0.0))  # 이 점수 미만 passage 는 버린다
+RERANK_BATCH_SIZE = 32
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("RAG_CONTEXT_TOKEN_BUDGET", 512))  # 문맥 passage 전체 토큰 상한
+SCORE_CACHE_SIZE = 8192
+
+
+class Reranker:
+    def __init__(self, model_name=RERANK_MODEL_NAME, cache_size=SCORE_CACHE_SIZE):
+        self.model_name = model_name
+        self.model = None
+        self.model_lock = threading.Lock()
+        # (정규화된 질문, 인덱스 버전, passage id) → 점수. 같은 질문이 반복되면 cross-encoder 를 건너뛴다
+        self.cache_size = cache_size
+        self.scores = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'score_hits': 0, 'score_misses': 0}
+
+    def _get_model(self):
+        with self.model_lock:
+            if self.model is None:
+                from sentence_transformers import CrossEncoder
+                print(f"[INFO] rerank 모델 로딩 : {self.model_name}")
+                self.model = CrossEncoder(self.model_name)
+            return self.model
+
+    def score(self, key, version, question, candidates):
+        # candidates : (passage id, 본문) 목록. 캐시에 없는 쌍만 한 번의 배치로 채점
+        scores, missing = {}, []
+        with self.lock:
+            for doc_id, text in candidates:
+                cached = self.scores.get((key, version, doc_id))
+                if cached is None:
+                    missing.append((doc_id, text))
+                else:
+                    self.scores.move_to_end((key, version, doc_id))
+                    scores[doc_id] = cached
+            self.stats['score_hits'] += len(scores)
+            self.stats['score_misses'] += len(missing)
+
+        if missing:
+            predicted = self._get_model().predict([(question, text) for _, text in missing],
+                                                  batch_size=RERANK_BATCH_SIZE)
+            with self.lock:
+                for (doc_id, _), value in zip(missing, predicted):
+                    scores[doc_id] = float(value)
+                    self.scores[(key, version, doc_id)] = float(value)
+                while len(self.scores) > self.cache_size:
+                    self.scores.popitem(last=False)
+        return scores
+
+    def select(self, key, version, question, candidates, top_k, count_tokens=len,
+               min_score=RERANK_MIN_SCORE, token_budget=CONTEXT_TOKEN_BUDGET):
+        # 점수 순으로 min_score 이상인 passage 를 token_budget 을 넘지 않을 때까지 최대 top_k 개 선택
+        # count_tokens 를 주지 않으면 글자 수로 센다 (한국어는 토큰 수보다 크게 나오므로 보수적)
+        scores = self.score(key, version, question, candidates)
+        texts = dict(candidates)
+        selected, used = [], 0
+        for doc_id in sorted(scores, key=scores.get, reverse=True):
+            if scores[doc_id] < min_score or len(selected) >= top_k:
+                break
+            tokens = count_tokens(texts[doc_id])
+            if selected and used + tokens > token_budget:
+                continue  # 더 짧은 다음 후보는 들어갈 수 있다
+            selected.append(doc_id)
+            used += tokens
+        return tuple(selected), scores
+
+    def get_stats(self):
+        with self.lock:
+            return {**self.stats, 'size': len(self.scores), 'maxsize': self.cache_size}
+
+
+_reranker = None
+
+
+def get_reranker():
+    # RAG_RERANK=1 일 때만 사용. 꺼져 있으면 None
+    global _reranker
+    if not RERANK_ENABLED:
+        return None
+    if _reranker is None:
+        _reranker = Reranker()
+    return _reranker